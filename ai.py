@@ -1,141 +1,468 @@
+import time
+import numpy as np
 from model import BoardState
-import copy
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from ordering import MoveOrderer, static_exchange, PIECE_VALUES
+from pst import score_boards
+from tablebase import tablebases
+
+# checkmate scores.  A mate found n plies from the root scores MATE - n, so the search prefers the quickest mate
+# (and the slowest way to get mated).  Any score beyond MATE_THRESHOLD is a mate score.
+MATE = 10000
+MATE_THRESHOLD = MATE - 256
+
+# quiescence search - a capture is skipped when even winning the captured piece plus DELTA_MARGIN can't bring the
+# score back up to alpha (delta pruning).  MAX_QUIESCENCE_PLY stops runaway capture sequences.
+DELTA_MARGIN = 200
+MAX_QUIESCENCE_PLY = 64
+
+# null move pruning - the null move is searched NULL_MOVE_REDUCTION plies shallower than a real move would be (one more
+# in deep searches), and only at nodes at least NULL_MOVE_MIN_DEPTH from the horizon.
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+# late move reductions - the first LMR_FULL_DEPTH_MOVES moves of a node are always searched to full depth, the quiet
+# moves after them one ply shallower (two after twice as many), at nodes at least LMR_MIN_DEPTH from the horizon.
+LMR_FULL_DEPTH_MOVES = 3
+LMR_MIN_DEPTH = 3
+# aspiration windows - iterations from ASPIRATION_MIN_DEPTH on search the root with a window of ASPIRATION_WINDOW
+# either side of the last iteration's score
+ASPIRATION_WINDOW = 50
+ASPIRATION_MIN_DEPTH = 3
 
 def evaluate(board:BoardState):
     # this function evaluates a given board state.  returns a positive "score" if black is winning, negative "score" if white is winning
-    score = 0
-
-    # the various piece values and associated integer codes
-    # pawn value = 100, 11/12
-    # bishop value = 300, 5/6
-    # knight value = 300, 7/8
-    # rook value = 500, 9/10
-    # queen value = 900, 3/4
-    piece_values = [(3,900),(4,900),(5,300),(6,300),(7,300),(8,300),(9,500),(10,500),(11,100),(12,100)]
-
-    # add up the values of all of the pieces
-    for rank in range(8):
-        for file in range(8):
-            if board.board[rank][file] != 0:
-                if board.board[rank][file] > 2:
-                    # gets the piece's value from the piece_values list
-                    piece_value = [value[1] for value in piece_values if board.board[rank][file] == value[0]]
-                    if board.board[rank][file] % 2 == 1: # if the piece is white
-                        score -= piece_value[0]
-                    else: # if the piece is black
-                        score += piece_value[0]
-
-    # give a slight score increase to a player in check to make the AI more aggressive.
-    if board.in_check('w'):
-        score += 30 
-        if board.in_checkmate('w'):
-            score = 10000
-    elif board.in_check('b'):
-        score -= 30 
-        if board.in_checkmate('b'):
-            score = -10000
-            
+    # the score is the material and piece-square score, which the board keeps up to date as moves are made and unmade (see pst.py),
+    # so this doesn't have to look at the board at all.  Checkmate and stalemate are found by the search, which generates the moves anyway.
+    # Endings with a tablebase (see tablebase.py) are scored exactly by the search, through Searcher.probe_tablebase.
+    return board.score
+
+def evaluate_many(boards):
+    # evaluates a list of board states in one go (see pst.score_boards), e.g. all the children of a node or a whole
+    # dataset.  Returns an array of scores in the same order, the same as evaluate(board) for each board.
+    if len(boards) == 0:
+        return np.zeros(0, dtype=np.int32)
+    return score_boards(np.stack([board.board for board in boards]))
+
+def score_to_tt(score, ply):
+    # mate scores are stored in the transposition table relative to the node instead of the root,
+    # so they stay correct when the same board is reached at a different ply
+    if score > MATE_THRESHOLD:
+        return score + ply
+    if score < -MATE_THRESHOLD:
+        return score - ply
     return score
 
-# It just returns a board given the board in the parameter.
-def get_board_from_move(board:BoardState, r1, f1, r2, f2):
-    board = copy.deepcopy(board) # check if this 
-    board.move_piece(r1, f1, r2, f2) # make sure this makes a copy
-    return board
+def score_from_tt(score, ply):
+    if score > MATE_THRESHOLD:
+        return score - ply
+    if score < -MATE_THRESHOLD:
+        return score + ply
+    return score
 
-def get_next_moves(board:BoardState, player):
-        # this function returns all possible boards one move ahead of the given board.
-        # returns as a list of Board objects
+class SearchTimeout(Exception):
+    # raised inside the search when the time budget runs out (or the search is stopped), to unwind the whole search at once
+    pass
 
-        # player is a boolean used in the minimax algorithm.  It represents the maximizing player.
-        # since black is always going to be the maximizing player, 
-        # if player is True we will return the moves of the black player, 
-        # if it is False we will return the moves of the white player.
+# time controls - the fraction of the remaining clock to spend on one move when no movetime is given,
+# and the time kept in reserve so the clock never runs out
+MOVES_TO_GO = 30
+SAFETY_MARGIN = 0.05
 
-        color = 'b' if player else 'w'
+def allocate_time(movetime=None, time_left=None, increment=0):
+    # returns the number of seconds to spend on a move, or None for no limit
+    if movetime is not None:
+        return movetime
+    if time_left is not None:
+        budget = time_left / MOVES_TO_GO + increment * 0.8
+        return max(0.01, min(budget, time_left / 2) - SAFETY_MARGIN)
+    return None
 
-        all_legal_moves = board.get_all_legal_moves(color)
+class Searcher:
+    # a Searcher holds the state a search keeps between nodes and between moves: the transposition table,
+    # the move ordering tables, the principal variation of the last finished iteration and the time limit of the current search.
+    # tt_size_mb is the memory budget of the transposition table.
+    # Setting stop to True (e.g. from another thread) ends the current search as if its time had run out, and
+    # on_iteration, if set, is called with the progress of the search (see iterative_deepening) after every iteration.
+    # pvs, null_move, late_move_reductions and aspiration_windows switch those parts of the search off when set to
+    # False, e.g. to measure what each one saves (see stats) or to play against the search without them (selfplay.py).
 
-        # all_legal_moves = optimize_move_order(all_legal_moves, board, color)
+    def __init__(self, tt_size_mb=16):
+        self.tt = TranspositionTable(tt_size_mb)
+        self.ordering = MoveOrderer()
+        self.pv = []
+        self.follow_pv = False
+        self.deadline = None
+        self.start_time = None
+        self.budget = None
+        self.stop = False
+        self.on_iteration = None
+        self.pvs = True
+        self.null_move = True
+        self.late_move_reductions = True
+        self.aspiration_windows = True
+        # move_lists[ply] - the list the moves of a node at that ply are generated into, reused from node to node
+        self.move_lists = []
+        # the functions the search calls for move generation, making and taking back moves, evaluation and tablebase
+        # probes.  They are looked up on the searcher, so instrument.py can swap in timed versions for one searcher
+        # without slowing down any other.
+        self.legal_moves = BoardState.get_all_legal_moves
+        self.make_move = BoardState.make_move
+        self.unmake_move = BoardState.unmake_move
+        self.evaluate = evaluate
+        self.probe_tablebase = tablebases.probe
+        self.reset_counters()
 
-        all_legal_boards = []
-        for move in all_legal_moves:
-            new_board = get_board_from_move(board, move[0][0], move[0][1], move[1][0], move[1][1])
-            all_legal_boards.append(new_board)
-        
-        return all_legal_boards
+    def reset_counters(self):
+        # nodes searched, and how many of the nodes with a cutoff had it on the first move searched (a measure of move ordering)
+        self.nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        # how often each pruning method was tried and worked, and the re-searches they needed
+        self.null_moves = 0
+        self.null_move_cutoffs = 0
+        self.reductions = 0
+        self.reduction_researches = 0
+        self.pvs_researches = 0
+        self.aspiration_researches = 0
 
-def minimax(board, depth, alpha, beta, maximizing_player):
-    # base case: if the depth limit has been reached or if the board is a winning board.
-    score = evaluate(board)
-    # print(board.board, "score: ", score)
-    if depth == 0 or score == -10000 or score == 10000:
-        return (score, board)
-        
-    # if it is the AI's move (the AI is trying to maximize their score)
-    if maximizing_player:
-        max_eval = -10001
-        best_board = None
-        # print('hello')
-        # print(get_next_moves(board, maximizing_player))
-        for move in get_next_moves(board, maximizing_player):
-            # print('hello')
-            # if depth == 2:
-            #     print(move.board)
-            eval = minimax(move,(depth-1), alpha, beta, False)
-            if eval[0] >= max_eval:
-                max_eval = eval[0]
-                best_board = move
-            alpha = max(alpha, eval[0])
-            if beta <= alpha:
+    def stats(self):
+        return {
+            'nodes': self.nodes,
+            'cutoffs': self.cutoffs,
+            'first_move_cutoffs': self.first_move_cutoffs,
+            'first_move_cutoff_rate': self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0,
+            'null_moves': self.null_moves,
+            'null_move_cutoffs': self.null_move_cutoffs,
+            'reductions': self.reductions,
+            'reduction_researches': self.reduction_researches,
+            'pvs_researches': self.pvs_researches,
+            'aspiration_researches': self.aspiration_researches,
+            'tt': self.tt.stats(),
+        }
+
+    def minimax(self, board, depth, alpha, beta, maximizing_player):
+        # searches the board to a fixed depth and returns (score, best move, principal variation).  The best move is None
+        # if there are no legal moves.  The board is played on and put back by the search, and is left as it was given:
+        # the caller plays the move it picks (e.g. Game.apply_ai_move).
+        # Like everything outside the search, the score and the window are from black's point of view (see evaluate).
+        self.tt.new_search()
+        self.ordering.new_search()
+        self.reset_counters()
+        self.deadline = None
+        self.follow_pv = False
+        if maximizing_player:
+            score, best_move = self.search(board, depth, alpha, beta, 0)
+        else:
+            score, best_move = self.search(board, depth, -beta, -alpha, 0)
+            score = -score
+        self.pv = self.get_pv(board, depth) if best_move is not None else []
+        return (score, best_move, self.pv)
+
+    def iterative_deepening(self, board, max_depth=None, movetime=None, time_left=None, increment=0, ponder=False):
+        # searches to depth 1, 2, 3... until max_depth is reached or the time budget (movetime, or the remaining clock
+        # time_left plus increment, in seconds) runs out.  Each iteration searches the previous iteration's principal
+        # variation first, with an aspiration window around the previous iteration's score (see aspiration_search).
+        # An iteration that runs out of time is thrown away, so the result always comes from the
+        # last finished iteration.  Returns (score, best_move, depth reached), the score from black's point of view.
+        # With ponder=True there is no time limit until ponderhit is called (see below).
+        self.budget = None if ponder else allocate_time(movetime, time_left, increment)
+        self.start_time = start = time.monotonic()
+        sign = 1 if board.current_move == 0 else -1 # turns the search's scores (for the side to move) into black's
+        undo_depth = len(board.undo_stack)
+        self.tt.new_search()
+        self.ordering.new_search()
+        self.reset_counters()
+        self.pv = []
+        self.deadline = None
+        result = (self.evaluate(board), None, 0)
+        # in a tablebase ending every move is scored exactly at depth 1, so searching deeper can't change anything
+        exact = self.probe_tablebase(board) is not None
+
+        depth = 0
+        score = None
+        while max_depth is None or depth < max_depth:
+            depth += 1
+            # the first iteration always finishes (unless the search is stopped), so there is always a move to play
+            if depth > 1 and self.budget is not None:
+                self.deadline = self.start_time + self.budget
+            try:
+                score, best_move = self.aspiration_search(board, depth, score)
+            except SearchTimeout:
+                # put back the moves the interrupted search had played on the board
+                while len(board.undo_stack) > undo_depth:
+                    if board.undo_stack[-1][0] is None:
+                        board.unmake_null_move()
+                    else:
+                        board.unmake_move()
                 break
-        return (max_eval, best_board)
-    
-    # if it is the opponent's move (the AI is trying to minimize the opponent's score)
-    else:
-        min_eval = 10001
-        best_board = None
-        for move in get_next_moves(board, maximizing_player):
-            eval = minimax(move, (depth-1), alpha, beta, True)
-            if eval[0] <= min_eval:
-                min_eval = eval[0]
-                best_board = move
-            beta = min(beta, eval[0])
-            if beta <= alpha:
+            if best_move is None: # no legal moves
+                result = (sign * score, None, depth)
                 break
-        # if type(best_board) == None:
-        #     best_board = self.place()
-        return (min_eval, best_board)
+            self.pv = self.get_pv(board, depth)
+            result = (sign * score, best_move, depth)
+            if self.on_iteration is not None:
+                self.on_iteration({
+                    'depth': depth,
+                    'score': sign * score,
+                    'move': best_move,
+                    'pv': self.pv,
+                    'nodes': self.nodes,
+                    'seconds': time.monotonic() - start,
+                })
+            if exact or score > MATE_THRESHOLD or score < -MATE_THRESHOLD:
+                break
+            # an iteration takes several times as long as the previous one, so don't start one that can't finish
+            if self.budget is not None and time.monotonic() - self.start_time > self.budget / 2:
+                break
+
+        self.deadline = None
+        return result
+
+    def aspiration_search(self, board, depth, previous_score):
+        # searches the root with a narrow window around the last iteration's score, which cuts off more of the tree
+        # than a full window.  If the score falls outside the window the window is widened on that side and the
+        # iteration searched again.  The first iterations (and mate scores) get a full window.
+        if (not self.aspiration_windows or previous_score is None or depth < ASPIRATION_MIN_DEPTH
+                or abs(previous_score) > MATE_THRESHOLD):
+            self.follow_pv = True
+            return self.search(board, depth, -10001, 10001, 0)
+        delta = ASPIRATION_WINDOW
+        alpha, beta = previous_score - delta, previous_score + delta
+        while True:
+            self.follow_pv = True
+            score, best_move = self.search(board, depth, alpha, beta, 0)
+            if score <= alpha:
+                alpha = max(-10001, alpha - delta)
+            elif score >= beta:
+                beta = min(10001, beta + delta)
+            else:
+                return score, best_move
+            self.aspiration_researches += 1
+            delta *= 4
+
+    def ponderhit(self, movetime=None, time_left=None, increment=0):
+        # turns a ponder search (searching the board after the move the opponent was expected to play, while they think)
+        # into a normal one once they play it.  The time already spent pondering counts toward the budget, so after a
+        # long ponder the search can stop at once with the result of the iterations it has already finished.
+        # Called from another thread while iterative_deepening runs.
+        self.budget = allocate_time(movetime, time_left, increment)
+        if self.budget is not None and self.pv: # the first iteration still always finishes
+            self.deadline = self.start_time + self.budget
+
+    def get_pv(self, board, depth):
+        # the principal variation - the line of best moves found by the last search, read back from the transposition table
+        pv = []
+        for _ in range(depth):
+            entry = self.tt.probe(board.zobrist)
+            if entry is None or entry[4] is None or entry[4] not in board.get_all_legal_moves(board.current_move):
+                break
+            pv.append(entry[4])
+            board.make_move(entry[4])
+        for _ in pv:
+            board.unmake_move()
+        return pv
 
     # The code for this algorithm is heavily inspired by Sebastian Lague's minimax video:
     # https://www.youtube.com/watch?v=l-hh51ncgDI
+    # It is written as negamax: every score in the search is from the point of view of the side to move, so a child's
+    # score is negated (and its window flipped) instead of having separate code for each player.
+    # Principal variation search: once the first move has set alpha, the other moves are searched with a zero window
+    # (alpha, alpha + 1), which only proves that they are no better, and are searched again with the full window only
+    # if one turns out to be better.  On top of that the search prunes with null moves and reduces late quiet moves
+    # (see NULL_MOVE_REDUCTION and LMR_FULL_DEPTH_MOVES).  Returns (score, best move).
+    def search(self, board, depth, alpha, beta, ply, null_allowed=True):
+        # base case: if the depth limit has been reached, only captures are searched from here (see quiescence)
+        if depth <= 0:
+            return (self.quiescence(board, alpha, beta, ply), None)
+
+        self.nodes += 1
+        if self.stop or (self.deadline is not None and time.monotonic() > self.deadline):
+            raise SearchTimeout()
+
+        color = board.current_move
+        # endings with a tablebase have an exact score (but the root still has to be searched for a move)
+        if ply > 0:
+            score = self.probe_tablebase(board, ply)
+            if score is not None:
+                return (score if color == 0 else -score, None)
+
+        # look the board up in the transposition table.  A result from a search at least as deep can end the search here
+        # (but not at the root, which has to return a move), and the stored best move is searched first.
+        entry = self.tt.probe(board.zobrist)
+        tt_move = None
+        if entry is not None:
+            tt_move = entry[4]
+            if ply > 0 and entry[1] >= depth:
+                tt_score, bound = score_from_tt(entry[2], ply), entry[3]
+                if bound == EXACT or (bound == LOWER and tt_score >= beta) or (bound == UPPER and tt_score <= alpha):
+                    return (tt_score, tt_move)
+
+        in_check = board.in_check(color)
+        pv_node = beta - alpha > 1
+
+        # null move pruning - if the side to move is so far ahead that even passing a turn (a "null move") and searching
+        # the rest shallower still scores at least beta, a real move would too, so the node is cut off without
+        # searching any.  Not when in check (passing would be illegal), not twice in a row, and not when the side to
+        # move has only pawns left, where being forced to move can be what loses (zugzwang).
+        if (self.null_move and null_allowed and not pv_node and not in_check and ply > 0 and depth >= NULL_MOVE_MIN_DEPTH
+                and board.occupancy[color] ^ board.bitboards[2 - color] ^ board.bitboards[12 - color]):
+            static_eval = self.evaluate(board)
+            if (static_eval if color == 0 else -static_eval) >= beta:
+                self.null_moves += 1
+                reduction = NULL_MOVE_REDUCTION + (1 if depth > 6 else 0)
+                board.make_null_move()
+                score = -self.search(board, depth - 1 - reduction, -beta, -beta + 1, ply + 1, False)[0]
+                board.unmake_null_move()
+                if score >= beta:
+                    self.null_move_cutoffs += 1
+                    # a mate found after passing isn't a real mate
+                    return (beta if score > MATE_THRESHOLD else score, None)
+
+        moves = self.legal_moves(board, color, moves=self.move_list(ply))
+
+        # no legal moves - checkmate if the side to move is in check, otherwise stalemate
+        if not moves:
+            score = -(MATE - ply) if in_check else 0
+            self.tt.store(board.zobrist, depth, score_to_tt(score, ply), EXACT, None)
+            return (score, None)
+
+        # while the search is still following the last iteration's principal variation, its move goes first,
+        # otherwise the move from the transposition table does (see ordering.py for the rest of the order)
+        pv_move = None
+        if self.follow_pv:
+            if ply < len(self.pv) and self.pv[ply] in moves:
+                pv_move = self.pv[ply]
+            else:
+                self.follow_pv = False
+        moves = self.ordering.order(board, moves, ply, pv_move or tt_move)
+
+        original_alpha = alpha
+        best_score = -10001
+        best_move = None
+        squares = board.squares
+        for i, move in enumerate(moves):
+            self.follow_pv = pv_move is not None and move == pv_move
+            quiet = squares[move >> 6 & 63] == 0 and not move >> 12
+            self.make_move(board, move)
+            if i == 0:
+                score = -self.search(board, depth - 1, -beta, -alpha, ply + 1)[0]
+            else:
+                # late move reductions - quiet moves ordered late are unlikely to be any good, so they are searched
+                # shallower first, and again at full depth only if they beat alpha.  Not for checks or check evasions.
+                reduction = 0
+                if (self.late_move_reductions and depth >= LMR_MIN_DEPTH and i >= LMR_FULL_DEPTH_MOVES and quiet
+                        and not in_check and not board.in_check(board.current_move)):
+                    reduction = 1 if i < 2 * LMR_FULL_DEPTH_MOVES else 2
+                    reduction = min(reduction, depth - 2)
+                    self.reductions += 1
+                # without pvs every move gets the full window
+                child_beta = -alpha - 1 if self.pvs else -beta
+                score = -self.search(board, depth - 1 - reduction, child_beta, -alpha, ply + 1)[0]
+                if reduction and score > alpha:
+                    self.reduction_researches += 1
+                    score = -self.search(board, depth - 1, child_beta, -alpha, ply + 1)[0]
+                if self.pvs and alpha < score < beta:
+                    self.pvs_researches += 1
+                    score = -self.search(board, depth - 1, -beta, -alpha, ply + 1)[0]
+            self.unmake_move(board)
+            # a move only replaces the best move if it is strictly better - a later move that fails low can return
+            # a score equal to alpha without actually being as good
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                self.record_cutoff(board, move, i, ply, depth)
+                break
+
+        if best_score <= original_alpha:
+            bound = UPPER
+        elif best_score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.tt.store(board.zobrist, depth, score_to_tt(best_score, ply), bound, best_move)
+        return (best_score, best_move)
+
+    def quiescence(self, board, alpha, beta, ply):
+        # searches captures only until the board is quiet, so the evaluation is never taken in the middle of an exchange.
+        # The side to move can always "stand pat" (stop capturing and take the static evaluation), unless it is in check,
+        # in which case every move is searched and having none is checkmate.  Scores are for the side to move, as in search.
+        self.nodes += 1
+        if self.stop or (self.deadline is not None and time.monotonic() > self.deadline):
+            raise SearchTimeout()
+
+        color = board.current_move
+        score = self.probe_tablebase(board, ply)
+        if score is not None:
+            return score if color == 0 else -score
+
+        # the cap on capture sequences holds in check too, where every evasion is searched
+        if ply >= MAX_QUIESCENCE_PLY:
+            stand_pat = self.evaluate(board)
+            return stand_pat if color == 0 else -stand_pat
+
+        in_check = board.in_check(color)
+        if in_check:
+            moves = self.legal_moves(board, color, moves=self.move_list(ply))
+            if not moves:
+                return -(MATE - ply)
+            best_score = -10001
+            stand_pat = None
+        else:
+            stand_pat = self.evaluate(board)
+            if color == 1:
+                stand_pat = -stand_pat
+            if stand_pat >= beta:
+                return stand_pat
+            best_score = stand_pat
+            alpha = max(alpha, stand_pat)
+            moves = self.legal_moves(board, color, captures_only=True, moves=self.move_list(ply))
+
+        for move in self.ordering.order(board, moves, ply):
+            if stand_pat is not None:
+                # delta pruning - skip captures that can't raise the score to alpha even if the piece is won for free
+                promotion = move >> 12
+                captured = board.squares[move >> 6 & 63]
+                if captured == 0 and board.squares[move & 63] >= 11 and (move ^ move >> 6) & 7:
+                    captured = 11 # en passant - the pawn taken isn't on the square moved to
+                gain = PIECE_VALUES[captured] + (PIECE_VALUES[2 * promotion + 1] - 100 if promotion else 0)
+                if stand_pat + gain + DELTA_MARGIN <= alpha:
+                    continue
+                # captures that lose material once the exchange on the square is played out aren't worth searching
+                if not promotion and static_exchange(board, move) < 0:
+                    continue
+
+            self.make_move(board, move)
+            score = -self.quiescence(board, -beta, -alpha, ply + 1)
+            self.unmake_move(board)
+            if score > best_score:
+                best_score = score
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+        return best_score
+
+    def move_list(self, ply):
+        # generating moves into the same lists over and over saves making a new list at every node.  A node's list
+        # stays in use while its children are searched, so each ply has its own.
+        while ply >= len(self.move_lists):
+            self.move_lists.append([])
+        return self.move_lists[ply]
+
+    def record_cutoff(self, board, move, move_number, ply, depth):
+        self.cutoffs += 1
+        if move_number == 0:
+            self.first_move_cutoffs += 1
+        self.ordering.record_cutoff(board, move, ply, depth)
+
+# the searcher used by the module level minimax function, so its transposition table is kept from one move to the next
+default_searcher = Searcher()
+
+def minimax(board, depth, alpha, beta, maximizing_player):
+    return default_searcher.minimax(board, depth, alpha, beta, maximizing_player)
 
-# def optimize_move_order(moves:list, board:BoardState, color):
-#     # since A/B pruning's effectiveness can vary widely depending on the order of the moves searched, we we will try to optimize the order of the minimax search 
-#     # by sorting the moves passed into the minimax search to find some moves that are generally good.  For example:
-#     # -- when there is a capture of a high-value piece by a low-value piece, such as a pawn capturing a queen.
-
-#     piece_values = [(3,900),(4,900),(5,300),(6,300),(7,300),(8,300),(9,500),(10,500),(11,100),(12,100)]
-#     new_ordering = []
-#     captures = []
-
-#     print(moves)
-
-#     for move in moves:
-#         capturer_value = [value[1] for value in piece_values if value[0] == board.board[move[0][0]][move[0][1]]]
-#         if board.board[move[1][0]][move[1][1]] > 2 and board.board[move[1][0]][move[1][1]] % 2 == color: # if the move is a capture, see how "good" of a capture it is
-#             capturee_value = [value[1] for value in piece_values if value[0] == board.board[move[1][0]][move[1][1]]]
-#             print('m', board.board[move[1][0]][move[1][1]],'c',board.board[move[1][0]][move[1][1]])
-#             print(capturee_value, capturer_value)
-#             relative_capture_value = capturee_value[0] - capturer_value[0]
-#             captures.append((move, relative_capture_value))
-#         else: # otherwise, just add it to new ordering.
-#             new_ordering.append(move)
-    
-#     captures.sort(key=lambda x: x[1]) # sort catures by "relative_capture_value".
-#     for capture in captures:
-#         new_ordering.insert(0,capture[0]) # add the captures to the front of the list.
-
-#     return new_ordering
-
-            
+def iterative_deepening(board, max_depth=None, movetime=None, time_left=None, increment=0, ponder=False):
+    return default_searcher.iterative_deepening(board, max_depth, movetime, time_left, increment, ponder)
@@ -0,0 +1,141 @@
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import ai
+from model import move_to_str, parse_epd
+
+# analyze - searches every position in FEN or EPD files and writes one JSON line per position:
+#   python analyze.py positions.epd -o results.jsonl --depth 4 --workers 4
+#   {"index": 0, "id": "WAC.001", "fen": "...", "move": "g3g6", "score": 420, "mate": null, "depth": 4, "nodes": 12345, "seconds": 0.81, "pv": [...]}
+# score is in centipawns from the side to move's point of view (mate is the number of moves to mate, negative when
+# getting mated).  A line that can't be read, or a position that can't happen (not exactly one king a side, or the side
+# not to move in check), gets {"index": ..., "line": ..., "error": ...} instead.
+# The files are read a line at a time and only a few positions per worker are in flight at once, so memory use stays
+# the same however long the input is.  Results are written in input order, one line at a time as they finish, so after
+# an interruption --resume skips as many positions as the output file already has lines and carries on from there.
+
+IN_FLIGHT_PER_WORKER = 4
+
+_searcher = None
+
+def _init_worker(tt_size_mb):
+    global _searcher
+    _searcher = ai.Searcher(tt_size_mb)
+
+def read_positions(paths):
+    # yields (index, line) for every position (FEN line, or EPD line - see model.parse_epd) in the files, lazily.
+    # blank lines and # comments are skipped.
+    index = 0
+    for path in paths:
+        with open(path) as file:
+            for line in file:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    yield index, line
+                    index += 1
+
+def analyze_position(task):
+    index, line, depth, movetime = task
+    try:
+        board, operations = parse_epd(line)
+        # a position the search can't make sense of (e.g. an empty board would come out as mate in 0) is bad input too
+        board.validate()
+        fen = board.to_fen()
+        # every position starts from empty tables, so its result doesn't depend on what the worker searched before
+        _searcher.tt.clear()
+        _searcher.ordering.clear()
+        start = time.perf_counter()
+        score, move, depth_reached = _searcher.iterative_deepening(board, max_depth=depth, movetime=movetime)
+        elapsed = time.perf_counter() - start
+    except Exception as error:
+        return {'index': index, 'line': line, 'error': f"{type(error).__name__}: {error}"}
+
+    if board.current_move == 1: # scores are positive when black is ahead
+        score = -score
+    mate = None
+    if score > ai.MATE_THRESHOLD:
+        mate = (ai.MATE - score + 1) // 2
+    elif score < -ai.MATE_THRESHOLD:
+        mate = -((ai.MATE + score + 1) // 2)
+    return {
+        'index': index,
+        'id': operations.get('id'),
+        'fen': fen,
+        'move': move_to_str(move) if move is not None else None,
+        'score': score,
+        'mate': mate,
+        'depth': depth_reached,
+        'nodes': _searcher.nodes,
+        'seconds': round(elapsed, 3),
+        'pv': [move_to_str(pv_move) for pv_move in _searcher.pv],
+    }
+
+def count_done(path):
+    # the number of results already in the output file.  A last line cut off by the interruption is removed.
+    if not os.path.exists(path):
+        return 0
+    done = 0
+    end = 0 # the end of the last complete line
+    with open(path, 'rb') as file:
+        for line in file:
+            if not line.endswith(b'\n'):
+                break
+            done += 1
+            end += len(line)
+    if end != os.path.getsize(path):
+        with open(path, 'r+b') as file:
+            file.truncate(end)
+    return done
+
+def analyze(paths, output, depth=None, movetime=None, workers=None, skip=0, tt_size_mb=16):
+    # searches the positions and writes the results to output (a text file), skipping the first skip positions.
+    # returns the number of positions analyzed.
+    workers = workers or os.cpu_count() or 1
+    tasks = ((index, line, depth, movetime) for index, line in read_positions(paths) if index >= skip)
+    pending = collections.deque()
+    analyzed = 0
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(tt_size_mb,)) as pool:
+        for task in tasks:
+            pending.append(pool.submit(analyze_position, task))
+            # once enough positions are queued up, wait for the oldest before reading more
+            if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                output.write(json.dumps(pending.popleft().result()) + '\n')
+                output.flush()
+                analyzed += 1
+        while pending:
+            output.write(json.dumps(pending.popleft().result()) + '\n')
+            output.flush()
+            analyzed += 1
+    return analyzed
+
+def main():
+    parser = argparse.ArgumentParser(description="Search every position in FEN/EPD files and write the results as JSON lines.")
+    parser.add_argument('inputs', nargs='+', help="FEN or EPD files, one position per line")
+    parser.add_argument('-o', '--output', help="the JSONL file to write (default: stdout)")
+    parser.add_argument('--depth', type=int, help="search depth for each position")
+    parser.add_argument('--movetime', type=float, help="seconds to search each position")
+    parser.add_argument('--workers', type=int, help="number of worker processes (default: one per CPU)")
+    parser.add_argument('--hash', type=int, default=16, help="transposition table size per worker, in MB")
+    parser.add_argument('--resume', action='store_true', help="skip the positions already in the output file")
+    args = parser.parse_args()
+    if args.depth is None and args.movetime is None:
+        parser.error("give a --depth or a --movetime")
+    if args.resume and not args.output:
+        parser.error("--resume needs an --output file")
+
+    if args.output is None:
+        analyzed = analyze(args.inputs, sys.stdout, args.depth, args.movetime, args.workers, 0, args.hash)
+        skipped = 0
+    else:
+        skipped = count_done(args.output) if args.resume else 0
+        with open(args.output, 'a' if args.resume else 'w') as output:
+            analyzed = analyze(args.inputs, output, args.depth, args.movetime, args.workers, skipped, args.hash)
+    print(f"analyzed {analyzed} positions" + (f" (skipped {skipped} already done)" if skipped else ""), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# bitboard - helpers and precomputed attack tables for the move generator in model.py.
+# A bitboard is a python int used as a 64 bit set, one bit per square.
+# Squares are numbered in the same order as the 8x8 board array: square = rank*8 + file,
+# so square 0 is the top left corner (board[0][0], a8) and square 63 is the bottom right corner (board[7][7], h1).
+
+FULL = 0xFFFFFFFFFFFFFFFF
+
+def square(rank, file):
+    return rank * 8 + file
+
+# SQUARES[square] - the (rank, file) tuple of every square, so move lists can share them instead of building new ones
+SQUARES = [(sq >> 3, sq & 7) for sq in range(64)]
+
+def bits_to_squares(bb):
+    # converts a bitboard to a list of (rank, file) tuples, lowest square first.
+    squares = []
+    while bb:
+        lsb = bb & -bb
+        sq = lsb.bit_length() - 1
+        squares.append((sq >> 3, sq & 7))
+        bb ^= lsb
+    return squares
+
+def lsb_square(bb):
+    # index of the lowest set bit (the bitboard must not be empty)
+    return (bb & -bb).bit_length() - 1
+
+def _offset_table(offsets):
+    # builds a 64 entry table of the squares reachable from each square with a single jump by one of the offsets.
+    table = []
+    for rank in range(8):
+        for file in range(8):
+            bb = 0
+            for x, y in offsets:
+                if -1 < rank + x < 8 and -1 < file + y < 8:
+                    bb |= 1 << square(rank + x, file + y)
+            table.append(bb)
+    return table
+
+KNIGHT_ATTACKS = _offset_table([(2,1),(2,-1),(1,-2),(1,2),(-1,2),(-1,-2),(-2,1),(-2,-1)])
+KING_ATTACKS = _offset_table([(-1,0),(-1,1),(0,1),(1,1),(1,0),(1,-1),(0,-1),(-1,-1)])
+
+# PAWN_ATTACKS[color][square] - the squares a pawn of the given color attacks (0 for black, 1 for white, same as current_move).
+# white pawns move up the array (towards rank index 0), black pawns move down.
+PAWN_ATTACKS = [_offset_table([(1,1),(1,-1)]), _offset_table([(-1,1),(-1,-1)])]
+
+# directions for the sliding pieces as (rank, file) steps.  The first four increase the square index as they go
+# (so the nearest blocker is the lowest set bit), the last four decrease it (nearest blocker is the highest set bit).
+DIRECTIONS = [(1,0),(0,1),(1,1),(1,-1),(-1,0),(0,-1),(-1,-1),(-1,1)]
+ROOK_DIRECTIONS = [0, 1, 4, 5]
+BISHOP_DIRECTIONS = [2, 3, 6, 7]
+
+def _ray_table(step):
+    x, y = step
+    table = []
+    for rank in range(8):
+        for file in range(8):
+            bb = 0
+            r, f = rank + x, file + y
+            while -1 < r < 8 and -1 < f < 8:
+                bb |= 1 << square(r, f)
+                r, f = r + x, f + y
+            table.append(bb)
+    return table
+
+# RAYS[direction][square] - every square from the square to the edge of the board in the given direction.
+RAYS = [_ray_table(step) for step in DIRECTIONS]
+
+def _slider_attacks(sq, occupied, directions):
+    # classical ray lookup: take the full ray, find the first blocker and cut the ray off behind it.
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            if d < 4:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= RAYS[d][blocker]
+        attacks |= ray
+    return attacks
+
+def rook_attacks(sq, occupied):
+    return _slider_attacks(sq, occupied, ROOK_DIRECTIONS)
+
+def bishop_attacks(sq, occupied):
+    return _slider_attacks(sq, occupied, BISHOP_DIRECTIONS)
+
+def queen_attacks(sq, occupied):
+    return _slider_attacks(sq, occupied, range(8))
+
+def _between_table():
+    # BETWEEN[a][b] - the squares strictly between a and b when they share a rank, file or diagonal, otherwise 0.
+    table = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        for x, y in DIRECTIONS:
+            between = 0
+            r, f = (sq >> 3) + x, (sq & 7) + y
+            while -1 < r < 8 and -1 < f < 8:
+                table[sq][square(r, f)] = between
+                between |= 1 << square(r, f)
+                r, f = r + x, f + y
+    return table
+
+BETWEEN = _between_table()
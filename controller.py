@@ -1,16 +1,24 @@
-from model import BoardState
+from model import BoardState, START_FEN
+from book import OpeningBook
 import math
+import os
 import ai
 
+# the Polyglot opening book the AI plays from while the position is in it (see book.py).  The game works without one.
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book.bin')
+
 class Game:
 
     # board represents a board state but simplified to board
     board = None
     current_move = None
+    book = None
 
-    def __init__(self):
-        self.board = BoardState("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w")
+    def __init__(self, book_path=BOOK_PATH):
+        self.board = BoardState(START_FEN)
         self.current_move = self.board.current_move
+        if book_path is not None and os.path.exists(book_path):
+            self.book = OpeningBook(book_path)
     
     # get_legal_moves takes a "gui_piece_rect" argument (when called from the GUI class), which is a pygame rect object representing the piece's location
     # on the board.  In this function, we convert the rect object to array indices and call the get_legal_moves method in the BoardState class (in model)
@@ -35,9 +43,34 @@ class Game:
             self.check_for_checkmate()
         
 
-    def move_piece_with_ai(self, depth):
-        self.board = ai.minimax(self.board, depth, -10001, 10001, True)[1]
-        self.current_move = 1 if self.current_move == 0 else 0 # change to next move
+    # a move for the AI from the opening book, or None if there is no book or the board isn't in it
+    def book_move(self):
+        if self.book is None:
+            return None
+        return self.book.choose(self.board)
+
+    # the AI plays from the opening book while it can.  Otherwise it searches to a fixed depth, or when movetime
+    # (in seconds) is given, as deep as it can in that time.
+    def move_piece_with_ai(self, depth=3, movetime=None):
+        move = self.book_move()
+        if move is not None:
+            self.apply_ai_move(move)
+        elif movetime is None:
+            self.apply_ai_move(ai.minimax(self.board, depth, -10001, 10001, True)[1])
+        else:
+            self.apply_ai_move(ai.iterative_deepening(self.board, movetime=movetime)[1])
+
+    # plays a move the AI found (e.g. on a worker thread, see worker.py) on the board.  move is None if the AI had no
+    # legal move: the game is over then, and current_move is set to None so neither side moves again.
+    def apply_ai_move(self, move):
+        if move is None:
+            self.current_move = None
+        else:
+            self.board.make_move(move)
+            self.current_move = self.board.current_move
+        self.check_for_check()
+        if self.board.white_in_check or self.board.black_in_check or move is None:
+            self.check_for_checkmate()
 
     def check_for_check(self):
         self.board.black_in_check = self.board.in_check('b')
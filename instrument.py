@@ -0,0 +1,267 @@
+import argparse
+import cProfile
+import io
+import json
+import pstats
+import sys
+import time
+
+import ai
+from model import BoardState, START_FEN, move_to_str
+
+# instrument - opt-in profiling of a Searcher, to see where the search spends its time and catch slowdowns:
+#   with SearchProfiler(searcher) as profiler:
+#       searcher.iterative_deepening(board, max_depth=5)
+#   profiler.save('profile.json')
+# While it is attached, the profiler counts nodes and cutoffs at every ply, records every iteration (nodes, time,
+# effective branching factor) and times every call the search makes to each phase in PHASES, with a histogram of the
+# call times.  With cprofile=True it also runs cProfile over each search, and trace, if given, is called with a dict
+# for every node of the main search (ply, depth, alpha, beta, score, move).
+# Nothing is changed in the search code itself: attaching sets timed versions of the phase functions as attributes on
+# this one searcher (and its transposition table and move orderer), detaching deletes them again, so a searcher without
+# a profiler runs exactly the same code as before.  The timing adds a little to each call it measures.
+#   python instrument.py --fen FEN --depth 5 [--cprofile] [-o profile.json]   profiles one search and prints a summary
+
+# phase name -> (the object holding the function, the attribute name).  'searcher' is the Searcher itself.
+PHASES = {
+    'movegen': ('searcher', 'legal_moves'),
+    'order': ('ordering', 'order'),
+    'make_move': ('searcher', 'make_move'),
+    'unmake_move': ('searcher', 'unmake_move'),
+    'evaluate': ('searcher', 'evaluate'),
+    'tablebase': ('searcher', 'probe_tablebase'),
+    'tt_probe': ('tt', 'probe'),
+    'tt_store': ('tt', 'store'),
+}
+
+CPROFILE_TOP = 25 # functions kept in the report, by time spent in the function itself
+
+class PhaseStats:
+    __slots__ = ('calls', 'ns', 'histogram')
+
+    def __init__(self):
+        self.calls = 0
+        self.ns = 0
+        # histogram[b] - calls that took between 2**(b-1) and 2**b nanoseconds
+        self.histogram = [0] * 64
+
+class SearchProfiler:
+
+    def __init__(self, searcher, cprofile=False, trace=None):
+        self.searcher = searcher
+        self.trace = trace
+        self.profile = cProfile.Profile() if cprofile else None
+        self.phases = {phase: PhaseStats() for phase in PHASES}
+        self.ply_nodes = []
+        self.ply_qnodes = []
+        self.ply_cutoffs = []
+        self.ply_first_move_cutoffs = []
+        self.iterations = []
+        self.searches = 0
+        self.nodes = 0
+        self.ns = 0
+        self.attached = []
+        self.last_iteration = None # (nodes, seconds) at the end of the last iteration of the current search
+
+    def owner(self, name):
+        return self.searcher if name == 'searcher' else getattr(self.searcher, name)
+
+    def attach(self):
+        if self.attached:
+            return
+        for phase, (owner, attribute) in PHASES.items():
+            self.wrap(self.owner(owner), attribute, self.timed(self.phases[phase], getattr(self.owner(owner), attribute)))
+        searcher = self.searcher
+        self.wrap(searcher, 'search', self.counted_search(searcher.search))
+        self.wrap(searcher, 'quiescence', self.counted_quiescence(searcher.quiescence))
+        self.wrap(searcher, 'record_cutoff', self.counted_cutoff(searcher.record_cutoff))
+        self.wrap(searcher, 'iterative_deepening', self.profiled(searcher.iterative_deepening))
+        self.wrap(searcher, 'minimax', self.profiled(searcher.minimax))
+        self.previous_on_iteration = searcher.on_iteration
+        searcher.on_iteration = self.record_iteration
+
+    def wrap(self, owner, attribute, function):
+        # the replaced attribute is put back on detach (a method is put back by deleting the instance attribute over it)
+        self.attached.append((owner, attribute, owner.__dict__.get(attribute)))
+        setattr(owner, attribute, function)
+
+    def detach(self):
+        if not self.attached:
+            return
+        for owner, attribute, original in reversed(self.attached):
+            if original is None:
+                delattr(owner, attribute)
+            else:
+                setattr(owner, attribute, original)
+        self.attached = []
+        self.searcher.on_iteration = self.previous_on_iteration
+
+    def __enter__(self):
+        self.attach()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.detach()
+
+    def timed(self, stats, function):
+        clock = time.perf_counter_ns
+        histogram = stats.histogram
+        def timed_function(*args, **kwargs):
+            start = clock()
+            result = function(*args, **kwargs)
+            elapsed = clock() - start
+            stats.calls += 1
+            stats.ns += elapsed
+            histogram[elapsed.bit_length()] += 1
+            return result
+        return timed_function
+
+    def count(self, counts, ply):
+        while ply >= len(counts):
+            counts.append(0)
+        counts[ply] += 1
+
+    def counted_search(self, search):
+        def counted(board, depth, alpha, beta, ply, null_allowed=True):
+            if depth > 0: # at depth 0 the node is counted by quiescence
+                self.count(self.ply_nodes, ply)
+            score, move = search(board, depth, alpha, beta, ply, null_allowed)
+            if self.trace is not None:
+                self.trace({'ply': ply, 'depth': depth, 'alpha': alpha, 'beta': beta, 'score': score, 'move': move})
+            return (score, move)
+        return counted
+
+    def counted_quiescence(self, quiescence):
+        def counted(board, alpha, beta, ply):
+            self.count(self.ply_qnodes, ply)
+            return quiescence(board, alpha, beta, ply)
+        return counted
+
+    def counted_cutoff(self, record_cutoff):
+        def counted(board, move, move_number, ply, depth):
+            self.count(self.ply_cutoffs, ply)
+            if move_number == 0:
+                self.count(self.ply_first_move_cutoffs, ply)
+            return record_cutoff(board, move, move_number, ply, depth)
+        return counted
+
+    def profiled(self, run):
+        # times a whole search (iterative_deepening or minimax) and runs cProfile over it, on the thread it runs on
+        def profiled_run(*args, **kwargs):
+            self.searches += 1
+            self.last_iteration = (0, 0.0)
+            start = time.perf_counter_ns()
+            if self.profile is not None:
+                self.profile.enable()
+            try:
+                return run(*args, **kwargs)
+            finally:
+                if self.profile is not None:
+                    self.profile.disable()
+                self.ns += time.perf_counter_ns() - start
+                self.nodes += self.searcher.nodes
+        return profiled_run
+
+    def record_iteration(self, progress):
+        nodes, seconds = self.last_iteration
+        previous = self.iterations[-1] if self.iterations and self.iterations[-1]['search'] == self.searches else None
+        iteration_nodes = progress['nodes'] - nodes
+        self.iterations.append({
+            'search': self.searches,
+            'depth': progress['depth'],
+            'nodes': iteration_nodes,
+            'seconds': round(progress['seconds'] - seconds, 6),
+            # how many times more nodes this iteration took than the last one
+            'branching_factor': round(iteration_nodes / previous['nodes'], 2) if previous and previous['nodes'] else None,
+            'score': progress['score'],
+            'move': move_to_str(progress['move']) if progress['move'] is not None else None,
+        })
+        self.last_iteration = (progress['nodes'], progress['seconds'])
+        if self.previous_on_iteration is not None:
+            self.previous_on_iteration(progress)
+
+    def report(self):
+        # everything recorded so far, as a dict that can be written out as JSON
+        seconds = self.ns / 1e9
+        phases = {}
+        for phase, stats in self.phases.items():
+            phases[phase] = {
+                'calls': stats.calls,
+                'seconds': round(stats.ns / 1e9, 6),
+                'mean_us': round(stats.ns / stats.calls / 1000, 3) if stats.calls else 0.0,
+                'share': round(stats.ns / self.ns, 4) if self.ns else 0.0, # fraction of the total search time
+                'histogram': [{'max_ns': 1 << b, 'calls': calls} for b, calls in enumerate(stats.histogram) if calls],
+            }
+        plies = []
+        for ply in range(max(len(self.ply_nodes), len(self.ply_qnodes))):
+            plies.append({
+                'ply': ply,
+                'nodes': self.ply_nodes[ply] if ply < len(self.ply_nodes) else 0,
+                'qnodes': self.ply_qnodes[ply] if ply < len(self.ply_qnodes) else 0,
+                'cutoffs': self.ply_cutoffs[ply] if ply < len(self.ply_cutoffs) else 0,
+                'first_move_cutoffs': self.ply_first_move_cutoffs[ply] if ply < len(self.ply_first_move_cutoffs) else 0,
+            })
+        report = {
+            'searches': self.searches,
+            'nodes': self.nodes,
+            'seconds': round(seconds, 6),
+            'nps': int(self.nodes / seconds) if seconds > 0 else 0,
+            'phases': phases,
+            'plies': plies,
+            'iterations': self.iterations,
+            'tt': self.searcher.tt.stats(),
+            'search': self.searcher.stats(), # the counters of the last search, e.g. how often null moves cut off
+        }
+        if self.profile is not None:
+            report['cprofile'] = self.cprofile_report()
+        return report
+
+    def cprofile_report(self):
+        stats = pstats.Stats(self.profile, stream=io.StringIO())
+        functions = []
+        for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.stats.items():
+            functions.append({'function': f"{filename}:{line}({name})", 'calls': calls,
+                              'tottime': round(tottime, 6), 'cumtime': round(cumtime, 6)})
+        functions.sort(key=lambda function: function['tottime'], reverse=True)
+        return functions[:CPROFILE_TOP]
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.report(), file, indent=1)
+
+def print_summary(report, file=sys.stdout):
+    print(f"{report['nodes']} nodes in {report['seconds']:.3f}s ({report['nps']} nps)", file=file)
+    print(f"\n{'phase':<12} {'calls':>9} {'seconds':>9} {'mean us':>8} {'share':>6}", file=file)
+    for phase, stats in report['phases'].items():
+        print(f"{phase:<12} {stats['calls']:>9} {stats['seconds']:>9.3f} {stats['mean_us']:>8.2f} {stats['share']:>6.1%}", file=file)
+    print(f"\n{'depth':>5} {'nodes':>9} {'seconds':>8} {'ebf':>6}  score move", file=file)
+    for iteration in report['iterations']:
+        ebf = '' if iteration['branching_factor'] is None else iteration['branching_factor']
+        print(f"{iteration['depth']:>5} {iteration['nodes']:>9} {iteration['seconds']:>8.3f} {ebf:>6}  {iteration['score']} {iteration['move']}", file=file)
+    print(f"\n{'ply':>3} {'nodes':>9} {'qnodes':>9} {'cutoffs':>8} {'first':>6}", file=file)
+    for ply in report['plies']:
+        first = f"{ply['first_move_cutoffs'] / ply['cutoffs']:.0%}" if ply['cutoffs'] else ''
+        print(f"{ply['ply']:>3} {ply['nodes']:>9} {ply['qnodes']:>9} {ply['cutoffs']:>8} {first:>6}", file=file)
+    if 'cprofile' in report:
+        print(f"\n{'tottime':>8} {'cumtime':>8} {'calls':>9}  function", file=file)
+        for function in report['cprofile']:
+            print(f"{function['tottime']:>8.3f} {function['cumtime']:>8.3f} {function['calls']:>9}  {function['function']}", file=file)
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile a search and print where its time goes.")
+    parser.add_argument('--fen', default=START_FEN)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--movetime', type=float, help="seconds to search instead of a fixed depth")
+    parser.add_argument('--cprofile', action='store_true', help="also run cProfile over the search")
+    parser.add_argument('-o', '--output', help="write the full report to this JSON file")
+    args = parser.parse_args()
+
+    searcher = ai.Searcher()
+    with SearchProfiler(searcher, cprofile=args.cprofile) as profiler:
+        searcher.iterative_deepening(BoardState(args.fen), max_depth=None if args.movetime else args.depth, movetime=args.movetime)
+    print_summary(profiler.report())
+    if args.output:
+        profiler.save(args.output)
+
+if __name__ == "__main__":
+    main()
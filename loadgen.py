@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from model import BoardState, move_to_str
+
+# loadgen - a load generator for server.py.  Opens --players connections, each of which plays --games games against the
+# server one after the other, making random legal moves as fast as the replies come back, and reports the games and
+# moves finished per second and the latency of the move requests (from sending the move to getting the AI's reply):
+#   python loadgen.py --port 8765 --players 32 --games 4 --time 5 --max-plies 40
+# --time is the AI's clock for each game (see server.py).  A game stops after --max-plies of the client's moves, so
+# runs take a predictable time.  --json prints the report as JSON.
+
+class Player:
+
+    def __init__(self, host, port, rng):
+        self.host, self.port = host, port
+        self.rng = rng
+        self.latencies = [] # seconds per move request
+        self.games = 0
+        self.errors = 0
+
+    async def request(self, message):
+        self.writer.write((json.dumps(message) + '\n').encode())
+        await self.writer.drain()
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("the server closed the connection")
+        return json.loads(line)
+
+    async def play(self, games, game_time, depth, max_plies):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            for _ in range(games):
+                await self.play_game(game_time, depth, max_plies)
+        finally:
+            self.writer.close()
+
+    async def play_game(self, game_time, depth, max_plies):
+        response = await self.request({'type': 'new', 'time': game_time, 'depth': depth})
+        if response['type'] == 'error':
+            self.errors += 1
+            return
+        game_id = response['game']
+        for _ in range(max_plies):
+            if response['status'] != 'playing':
+                break
+            board = BoardState(response['fen'])
+            move = move_to_str(self.rng.choice(board.get_all_legal_moves(board.current_move)))
+            start = time.perf_counter()
+            response = await self.request({'type': 'move', 'game': game_id, 'move': move})
+            self.latencies.append(time.perf_counter() - start)
+            if response['type'] == 'error':
+                self.errors += 1
+                break
+        await self.request({'type': 'close', 'game': game_id})
+        self.games += 1
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+async def run(host, port, players, games, game_time, depth, max_plies, seed):
+    clients = [Player(host, port, random.Random(seed + i)) for i in range(players)]
+    start = time.perf_counter()
+    results = await asyncio.gather(*(client.play(games, game_time, depth, max_plies) for client in clients), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    latencies = [latency for client in clients for latency in client.latencies]
+    finished = sum(client.games for client in clients)
+    return {
+        'players': players,
+        'games': finished,
+        'moves': len(latencies),
+        'seconds': round(elapsed, 3),
+        'games_per_second': round(finished / elapsed, 3),
+        'moves_per_second': round(len(latencies) / elapsed, 3),
+        'latency_p50': round(percentile(latencies, 0.5), 4),
+        'latency_p99': round(percentile(latencies, 0.99), 4),
+        'latency_max': round(max(latencies, default=0.0), 4),
+        'errors': sum(client.errors for client in clients),
+        'failed_players': sum(1 for result in results if isinstance(result, Exception)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many games against server.py at once and measure its throughput and latency.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--players', type=int, default=16, help="number of simultaneous connections")
+    parser.add_argument('--games', type=int, default=2, help="games each player plays")
+    parser.add_argument('--time', type=float, default=5, help="the AI's clock for each game, in seconds")
+    parser.add_argument('--depth', type=int, help="the AI's search depth limit")
+    parser.add_argument('--max-plies', type=int, default=40, help="the most moves the client makes in a game")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.host, args.port, args.players, args.games, args.time, args.depth, args.max_plies, args.seed))
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print(f"{report['games']} games, {report['moves']} moves in {report['seconds']}s by {report['players']} players")
+        print(f"{report['games_per_second']} games/s, {report['moves_per_second']} moves/s")
+        print(f"move latency p50 {report['latency_p50'] * 1000:.1f}ms, p99 {report['latency_p99'] * 1000:.1f}ms, max {report['latency_max'] * 1000:.1f}ms")
+        print(f"errors {report['errors']}, failed players {report['failed_players']}")
+    return 0 if report['failed_players'] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
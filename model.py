@@ -1,14 +1,18 @@
+import re
 import numpy as np
-import copy
+from bitboard import (square, bits_to_squares, lsb_square, rook_attacks, bishop_attacks, queen_attacks,
+                      KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, BETWEEN, SQUARES, FULL)
+from zobrist import hash_state, PIECE_KEYS, BLACK_TO_MOVE_KEY, CASTLING_KEYS, EN_PASSANT_KEYS
+from pst import SCORE
 
-# SAN_to_int - SAN is standard algebraic notation, the way pieces are represented in FEN strings.  
-# this method converts the SAN character to the integer representation as used here. (used in parse_board in board.py)
+# the letter of each piece code in FEN strings (PIECE_LETTERS[code], '.' for an empty square) and the other way round
+PIECE_LETTERS = '.KkQqBbNnRrPp'
+PIECE_CODES = {letter: code for code, letter in enumerate(PIECE_LETTERS) if code != 0}
+
+# SAN_to_int - SAN is standard algebraic notation, the way pieces are represented in FEN strings.
+# this method converts the SAN character to the integer representation as used here.
 def SAN_to_int(piece:str):
-    pieces = [(1,'K'),(2,'k'),(3,'Q'),(4,'q'),(5,'B'),(6,'b'),(7,'N'),(8,'n'),(9,'R'),(10,'r'),(11,'P'),(12,'p')]
-    for p in pieces:
-        if piece == p[1]:
-            return p[0]
-    return 0
+    return PIECE_CODES.get(piece, 0)
 
 def get_symbol(piece:int, invert_colors:bool):
     if piece == 0:
@@ -23,338 +27,470 @@ def get_symbol(piece:int, invert_colors:bool):
             return p[1]
     return ValueError("That is an invalid piece")
 
-class BoardState:
-    # board - an 8x8 numpy array representing the actual pieces on the board.  Pieces are represented as integers. 
-    board = None
-    current_move = None # nextMove - 0 or 1.  Indicates who's move it is.  (0 for black, 1 for white)
-
-    # castling = boolean array, index 0,1 indicate if white can castle kingside or queenside (respectively), 
-    # index 2,3 indicate if black can castle kingside, queenside (respectively)
-    castling = None
+# the starting position
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# castling rights are stored as bit flags in BoardState.castling
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+# CASTLING_MASK[square] - the castling rights that survive a move to or from the square.
+# moving the king or a rook (or capturing a rook on its starting square) removes the matching rights.
+CASTLING_MASK = [15] * 64
+CASTLING_MASK[square(7,4)] = 15 & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[square(7,7)] = 15 & ~WHITE_KINGSIDE
+CASTLING_MASK[square(7,0)] = 15 & ~WHITE_QUEENSIDE
+CASTLING_MASK[square(0,4)] = 15 & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASK[square(0,7)] = 15 & ~BLACK_KINGSIDE
+CASTLING_MASK[square(0,0)] = 15 & ~BLACK_QUEENSIDE
+
+# FEN fields - the castling letters, and tables to turn a piece placement field into squares (digits are expanded into
+# that many '.', then every letter is translated to its piece code, and anything else to 255) and back
+CASTLING_LETTERS = [(WHITE_KINGSIDE,'K'),(WHITE_QUEENSIDE,'Q'),(BLACK_KINGSIDE,'k'),(BLACK_QUEENSIDE,'q')]
+FEN_LETTERS_TO_CODES = bytes(PIECE_LETTERS.index(chr(byte)) if chr(byte) in PIECE_LETTERS else 255 for byte in range(256))
+FEN_CODES_TO_LETTERS = bytes.maketrans(bytes(range(13)), PIECE_LETTERS.encode())
+
+def square_name(sq):
+    # e.g. 'e4'
+    return 'abcdefgh'[sq & 7] + str(8 - (sq >> 3))
+
+def parse_square(name):
+    # the square index of a name like 'e4'
+    if len(name) != 2 or name[0] not in 'abcdefgh' or name[1] not in '12345678':
+        raise ValueError(f"invalid square {name!r}")
+    return square(8 - int(name[1]), ord(name[0]) - ord('a'))
+
+def parse_placement(placement:str):
+    # the squares of a FEN piece placement field, as a 64 byte bytearray
+    expanded = (placement.replace('8', '........').replace('7', '.......').replace('6', '......').replace('5', '.....')
+                .replace('4', '....').replace('3', '...').replace('2', '..').replace('1', '.'))
+    # eight ranks of eight squares, and nothing but piece letters
+    if len(expanded) != 71 or expanded[8::9] != '///////':
+        raise ValueError(f"invalid piece placement {placement!r}")
+    squares = bytearray(expanded.encode().translate(FEN_LETTERS_TO_CODES, b'/'))
+    if 255 in squares:
+        raise ValueError(f"invalid piece placement {placement!r}")
+    return squares
+
+def read_fen(fen:str):
+    # the fields of a FEN string: (squares, current_move, castling, en_passant, hm_clock, fm_clock), raising a ValueError
+    # if it can't be read.  The castling, en passant and clock fields are optional (an EPD position is the first four fields).
+    fields = fen.split()
+    if len(fields) < 2 or fields[1] not in ('w', 'b'):
+        raise ValueError(f"invalid FEN {fen!r}")
+    squares = parse_placement(fields[0])
+    current_move = 1 if fields[1] == 'w' else 0
+
+    castling_field = fields[2] if len(fields) > 2 else '-'
+    castling = 0
+    if castling_field != '-':
+        for flag, char in CASTLING_LETTERS:
+            if char in castling_field:
+                castling |= flag
+        if len(castling_field) > 4 or castling_field.strip('KQkq'):
+            raise ValueError(f"invalid castling rights {castling_field!r}")
+    en_passant = fields[3] if len(fields) > 3 else '-'
+    en_passant = None if en_passant == '-' else parse_square(en_passant)
+    try:
+        hm_clock = int(fields[4]) if len(fields) > 4 else 0
+        fm_clock = int(fields[5]) if len(fields) > 5 else 1
+    except ValueError:
+        raise ValueError(f"invalid move clocks in FEN {fen!r}") from None
+    return squares, current_move, castling, en_passant, hm_clock, fm_clock
+
+# fen_position - the fast path for batch tools and caches that only need to know which position a FEN is.  It reads and
+# checks the FEN like BoardState does, but skips the numpy view, the bitboards, the hash and the score, which are most of
+# the cost of setting up a board (about 3us instead of 10-12us a position here).  Returns the same key as
+# BoardState.position_key, so positions from FENs and from boards can be looked up in one dict.
+def fen_position(fen:str):
+    squares, current_move, castling, en_passant, _, _ = read_fen(fen)
+    return (bytes(squares), current_move, castling, en_passant)
+
+# moves are 16 bit integers: bits 0-5 are the square the piece moves from, bits 6-11 the square it moves to and
+# bits 12-14 the piece a pawn promotes to (0 if it isn't a promotion).  The promotion values are chosen so that the piece
+# code is 2 * promotion + 1 for white and 2 * promotion + 2 for black.
+PROMOTE_QUEEN = 1
+PROMOTE_BISHOP = 2
+PROMOTE_KNIGHT = 3
+PROMOTE_ROOK = 4
+
+def encode_move(from_sq, to_sq, promotion=0):
+    return from_sq | to_sq << 6 | promotion << 12
+
+def move_from(move):
+    return move & 63
+
+def move_to(move):
+    return move >> 6 & 63
+
+def promotion_piece(move, color):
+    # the piece code a promotion of color (1 for white, 0 for black) creates, or 0 if move isn't a promotion
+    promotion = move >> 12
+    return 2 * promotion + 2 - color if promotion else 0
 
-    # enPassant - an integer tuple with value (r,f): r is the rank, f is the integer value of the file
-    en_passant = None
-    
-    # hm_clock, fm_clock - integers representing the halfmove clock and fullmove clock.  
-    # halfmove is used for the fifty-move rule.
-    hm_clock = None
-    fm_clock = None
-
-    white_in_check = False
-    white_checkmated = False
-    black_in_check = False
-    black_checkmated = False
+class BoardState:
+    # board state attributes:
+    #   squares - a 64 byte bytearray of the piece on every square (square = rank * 8 + file, rank 0 is the 8th rank).
+    #             Pieces are represented as integers, 0 is an empty square.
+    #   board - the same bytes seen as an 8x8 numpy array (board[rank][file]).  It shares memory with squares, so it is
+    #           always up to date and writing to it writes to squares - but the bitboards, hash and score aren't updated,
+    #           so only change the board with set_square.
+    #   current_move - 0 or 1.  Indicates who's move it is.  (0 for black, 1 for white)
+    #   castling - integer bit flags (WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE) indicating
+    #              which castling moves are still allowed.
+    #   en_passant - the square a pawn can capture en passant on, or None
+    #   hm_clock, fm_clock - integers representing the halfmove clock and fullmove clock.  halfmove is used for the fifty-move rule.
+    #   bitboards, occupancy - the same position as squares, stored as 64 bit integers for the move generator (see init_bitboards)
+    #   undo_stack - one undo record for every move played with make_move, so unmake_move can take them back
+    #   zobrist - a 64 bit hash of the board state, kept up to date as moves are made (see zobrist.py)
+    #   score - material and piece-square evaluation of the board (positive if black is ahead), kept up to date as moves are made (see pst.py)
+    # __slots__ keeps board states small and attribute access fast, since the search makes a lot of moves on them.
+    __slots__ = ('squares', 'board', 'current_move', 'castling', 'en_passant', 'hm_clock', 'fm_clock', 'bitboards', 'occupancy',
+                 'undo_stack', 'zobrist', 'score', 'white_in_check', 'white_checkmated', 'black_in_check', 'black_checkmated')
 
     # initialize a board state with a fen string
     def __init__(self, fen):
+        self.white_in_check = False
+        self.white_checkmated = False
+        self.black_in_check = False
+        self.black_checkmated = False
         self.fen_to_board_state(fen)
 
+    def __getstate__(self):
+        # for pickling (e.g. sending a board to another process).  board is a view of squares, so it is made again from it.
+        return {name: getattr(self, name) for name in BoardState.__slots__ if name != 'board'}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.board = np.frombuffer(self.squares, dtype=np.uint8).reshape(8, 8)
+
     def printb(self, invert_colors):
         print("  ---------------------------------")
         for i in range(len(self.board)):
             for j in range(len(self.board[i])):
-                if j == 0: print(f'{(8-i)} |', end=" ") 
+                if j == 0: print(f'{(8-i)} |', end=" ")
                 print(get_symbol(self.board[i][j], invert_colors), end=" | ")
             print("\n  ---------------------------------")
         print("    A   B   C   D   E   F   G   H ")
 
     def fen_to_board_state(self, fen:str):
-
+        # sets up the board state from a FEN string, raising a ValueError if it can't be read (see read_fen).
         # rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1 -> fen for starting position
-
-        board = fen.split(' ')[0]
-        self.board = self.parse_board(board)
-        self.current_move = 1 if fen.split(' ')[1] == 'w' else 0
-
-    def parse_board(self, board:str):
-        fen_ranks = board.split('/')
-        int_ranks = []
-        for rank in fen_ranks:
-            # This for loop basically says "if the piece is a piece", convert to its integer representation.
-            # otherwise, fill the empty tiles indicated by the int value in the FEN
-            int_rank = []
-            for piece in rank:
-                if piece in "PRNBKQprnbkq":
-                    int_rank.append(SAN_to_int(piece))
-                elif piece in "12345678" and int(piece) > 0 and int(piece) < 9:
-                    for i in range(int(piece)):
-                        int_rank.append(0)
-                else:
-                    return ValueError("The FEN string may be invalid")
-
-            int_ranks.append(int_rank)
-            int_rank = []
-            
-        # return numpy array of the ranks.
-        return np.array(int_ranks)
-
-    def move_piece(self, r1, f1, r2, f2):   
+        self.squares, self.current_move, self.castling, self.en_passant, self.hm_clock, self.fm_clock = read_fen(fen)
+        self.board = np.frombuffer(self.squares, dtype=np.uint8).reshape(8, 8)
+        self.undo_stack = []
+        self.init_bitboards()
+
+    def validate(self):
+        # raises a ValueError if the position can't happen in a game, for positions from outside (files, UCI, the server):
+        # there has to be exactly one king of each color, and the side that just moved can't be left in check.
+        # The search relies on both (it would capture the king, or find no king to be in check with).
+        if self.bitboards[1].bit_count() != 1 or self.bitboards[2].bit_count() != 1:
+            raise ValueError("a position needs exactly one king of each color")
+        if self.in_check('w' if self.current_move == 0 else 'b'):
+            raise ValueError("the side that just moved is in check")
+
+    def position_key(self):
+        # the exact position (pieces, side to move, castling rights and en passant square, but not the clocks) as a
+        # hashable tuple, the same as fen_position gives for its FEN.  Unlike zobrist it can't collide.
+        return (bytes(self.squares), self.current_move, self.castling, self.en_passant)
+
+    def to_fen(self):
+        # the FEN string of the board state
+        placement = self.squares.translate(FEN_CODES_TO_LETTERS).decode()
+        placement = '/'.join([placement[0:8], placement[8:16], placement[16:24], placement[24:32],
+                              placement[32:40], placement[40:48], placement[48:56], placement[56:64]])
+        # runs of empty squares become digits, longest first (a rank can't have a run longer than 8)
+        placement = (placement.replace('........', '8').replace('.......', '7').replace('......', '6').replace('.....', '5')
+                     .replace('....', '4').replace('...', '3').replace('..', '2').replace('.', '1'))
+        castling = ''.join(char for flag, char in CASTLING_LETTERS if self.castling & flag) or '-'
+        en_passant = square_name(self.en_passant) if self.en_passant is not None else '-'
+        return f"{placement} {'w' if self.current_move == 1 else 'b'} {castling} {en_passant} {self.hm_clock} {self.fm_clock}"
+
+    def to_epd(self, operations=None):
+        # the EPD string of the board state: the first four FEN fields, then the operations (a dict like {'bm': 'Qg6', 'id': 'WAC.001'})
+        fields = self.to_fen().split()[:4]
+        for opcode, operand in (operations or {}).items():
+            if opcode == 'id' or re.fullmatch(r'c\d', opcode): # string operands are quoted
+                operand = f'"{operand}"'
+            fields.append(f"{opcode} {operand};" if operand != '' else f"{opcode};")
+        return ' '.join(fields)
+
+    def copy(self):
+        # a cheap copy of the board state (the squares and lists are copied, nothing else is shared)
+        board_copy = BoardState.__new__(BoardState)
+        for name in BoardState.__slots__:
+            setattr(board_copy, name, getattr(self, name))
+        board_copy.squares = bytearray(self.squares)
+        board_copy.board = np.frombuffer(board_copy.squares, dtype=np.uint8).reshape(8, 8)
+        board_copy.bitboards = self.bitboards[:]
+        board_copy.occupancy = self.occupancy[:]
+        board_copy.undo_stack = self.undo_stack[:]
+        return board_copy
+
+    def move_piece(self, r1, f1, r2, f2):
+        # pawns reaching the last rank are always promoted to a queen here
         if (r2,f2) in self.get_legal_moves(r1,f1):
-            piece = self.board[r1][f1]
-            self.board[r1][f1] = 0
-            self.board[r2][f2] = piece
-            self.current_move = 1 if self.current_move == 0 else 0 # change to next move
+            self.make_move(encode_move(square(r1, f1), square(r2, f2)))
+
+    def make_move(self, move):
+        # plays a psuedolegal move (see encode_move) on this board in place and pushes an undo record so unmake_move can
+        # take it back.  this handles castling (a king moving two files), en passant captures and promotions (to a queen
+        # if the move doesn't say).
+        # the undo record is (move, piece moved, piece captured, castling, en passant and halfmove clock packed into one int, hash)
+        from_sq = move & 63
+        to_sq = move >> 6 & 63
+        squares = self.squares
+        piece = squares[from_sq]
+        captured = squares[to_sq]
+        zobrist = self.zobrist
+        en_passant = self.en_passant
+        pawn = piece == 11 or piece == 12
+        if pawn and to_sq == en_passant:
+            # en passant - the captured pawn is beside the moving pawn, not on the destination square
+            capture_sq = (from_sq & 56) | (to_sq & 7)
+            captured = squares[capture_sq]
+            self.set_square(capture_sq, 0)
+
+        state = self.castling | (en_passant + 1 if en_passant is not None else 0) << 4 | self.hm_clock << 11
+        self.undo_stack.append((move, piece, captured, state, zobrist))
+
+        self.set_square(from_sq, 0)
+        if pawn and (to_sq < 8 or to_sq >= 56):
+            self.set_square(to_sq, 2 * ((move >> 12) or PROMOTE_QUEEN) + piece - 10) # piece - 10 is 1 for white, 2 for black
+        else:
+            self.set_square(to_sq, piece)
+
+        if (piece == 1 or piece == 2) and (to_sq - from_sq == 2 or from_sq - to_sq == 2):
+            # castling - move the rook to the other side of the king
+            rook_from, rook_to = (from_sq + 3, from_sq + 1) if to_sq > from_sq else (from_sq - 4, from_sq - 1)
+            self.set_square(rook_to, squares[rook_from])
+            self.set_square(rook_from, 0)
+
+        # the pieces were hashed by set_square, the rest of the state is hashed here
+        key = self.zobrist ^ BLACK_TO_MOVE_KEY ^ CASTLING_KEYS[self.castling]
+        if en_passant is not None:
+            key ^= EN_PASSANT_KEYS[en_passant & 7]
+        self.castling &= CASTLING_MASK[from_sq] & CASTLING_MASK[to_sq]
+        if pawn and (to_sq - from_sq == 16 or from_sq - to_sq == 16):
+            self.en_passant = (from_sq + to_sq) >> 1
+            key ^= EN_PASSANT_KEYS[from_sq & 7]
+        else:
+            self.en_passant = None
+        key ^= CASTLING_KEYS[self.castling]
+        self.zobrist = key
+        self.hm_clock = 0 if captured != 0 or pawn else self.hm_clock + 1
+        if self.current_move == 0:
+            self.fm_clock += 1
+        self.current_move = 1 if self.current_move == 0 else 0 # change to next move
+
+    def unmake_move(self):
+        # takes back the last move played with make_move
+        move, piece, captured, state, zobrist = self.undo_stack.pop()
+        self.castling = state & 15
+        en_passant = state >> 4 & 127
+        self.en_passant = en_passant - 1 if en_passant else None
+        self.hm_clock = state >> 11
+        self.current_move = 1 if self.current_move == 0 else 0
+        if self.current_move == 0:
+            self.fm_clock -= 1
+        from_sq = move & 63
+        to_sq = move >> 6 & 63
+
+        if (piece == 1 or piece == 2) and (to_sq - from_sq == 2 or from_sq - to_sq == 2):
+            rook_from, rook_to = (from_sq + 3, from_sq + 1) if to_sq > from_sq else (from_sq - 4, from_sq - 1)
+            self.set_square(rook_from, self.squares[rook_to])
+            self.set_square(rook_to, 0)
+
+        self.set_square(from_sq, piece)
+        if (piece == 11 or piece == 12) and to_sq == self.en_passant:
+            self.set_square(to_sq, 0)
+            self.set_square((from_sq & 56) | (to_sq & 7), captured)
+        else:
+            self.set_square(to_sq, captured)
+        self.zobrist = zobrist
+
+    def make_null_move(self):
+        # passes the turn without moving a piece (for null move pruning in the search).  The undo record has None for
+        # the move, and has to be taken back with unmake_null_move.
+        en_passant = self.en_passant
+        state = self.castling | (en_passant + 1 if en_passant is not None else 0) << 4 | self.hm_clock << 11
+        self.undo_stack.append((None, 0, 0, state, self.zobrist))
+        key = self.zobrist ^ BLACK_TO_MOVE_KEY
+        if en_passant is not None:
+            key ^= EN_PASSANT_KEYS[en_passant & 7]
+            self.en_passant = None
+        self.zobrist = key
+        self.hm_clock += 1
+        if self.current_move == 0:
+            self.fm_clock += 1
+        self.current_move = 1 if self.current_move == 0 else 0
+
+    def unmake_null_move(self):
+        _, _, _, state, zobrist = self.undo_stack.pop()
+        en_passant = state >> 4 & 127
+        self.en_passant = en_passant - 1 if en_passant else None
+        self.hm_clock = state >> 11
+        self.current_move = 1 if self.current_move == 0 else 0
+        if self.current_move == 0:
+            self.fm_clock -= 1
+        self.zobrist = zobrist
+
+    def init_bitboards(self):
+        # builds the bitboards from the squares.  bitboards[piece] holds every square with that piece on it,
+        # occupancy[color] holds every square with a piece of that color (index 0 for black, 1 for white, like current_move).
+        # The hash and score are computed from scratch in the same pass (zobrist.hash_board and pst.score_board do the same).
+        bitboards = [0] * 13
+        key = hash_state(self.current_move, self.castling, self.en_passant)
+        score = 0
+        piece_keys, scores = PIECE_KEYS, SCORE
+        for sq, piece in enumerate(self.squares):
+            if piece:
+                bitboards[piece] |= 1 << sq
+                key ^= piece_keys[piece][sq]
+                score += scores[piece][sq]
+        self.bitboards = bitboards
+        self.occupancy = [bitboards[2] | bitboards[4] | bitboards[6] | bitboards[8] | bitboards[10] | bitboards[12],
+                          bitboards[1] | bitboards[3] | bitboards[5] | bitboards[7] | bitboards[9] | bitboards[11]]
+        self.zobrist = key
+        self.score = score
+
+    def set_square(self, sq, piece):
+        # puts a piece (or 0 for empty) on a square, keeping the squares, the bitboards, the hash and the score in sync.
+        bit = 1 << sq
+        old_piece = self.squares[sq]
+        self.zobrist ^= PIECE_KEYS[old_piece][sq] ^ PIECE_KEYS[piece][sq]
+        self.score += SCORE[piece][sq] - SCORE[old_piece][sq]
+        if old_piece != 0:
+            self.bitboards[old_piece] ^= bit
+            self.occupancy[old_piece % 2] ^= bit
+        if piece != 0:
+            self.bitboards[piece] |= bit
+            self.occupancy[piece % 2] |= bit
+        self.squares[sq] = piece
 
     def legal_pawn_moves(self, color, rank, file):
-        legal_moves = []
-        
+        sq = square(rank, file)
+        empty = ~(self.occupancy[0] | self.occupancy[1])
+        ep_bit = 1 << self.en_passant if self.en_passant is not None else 0
+
         # LEGAL MOVES FOR WHITE
         if color == 'w':
-            # allows pawns to move 2 squares on their first move.
-            if rank == 6 and self.board[4][file] == 0:
-                legal_moves.append((4, file))
-        
-            # if the square infront of a pawn is empty, it can move there
-            if rank-1 > -1:
-                if self.board[rank-1][file] == 0:
-                    legal_moves.append(((rank-1), file))
-
+            # if the square infront of a pawn is empty, it can move there.  On their first move pawns can move 2 squares
+            # as long as both squares are empty.
+            pushes = (1 << (sq - 8)) & empty if rank > 0 else 0
+            if rank == 6 and pushes:
+                pushes |= (1 << (sq - 16)) & empty
+            # diagonal captures
+            captures = PAWN_ATTACKS[1][sq] & (self.occupancy[0] | ep_bit)
 
-            # check if left or right diagonal captures are possible
-            if rank-1 > -1 and rank-1 < 8 and file+1 > -1 and file+1 < 8:
-                if self.board[rank-1][file+1] != 0 and self.board[rank-1][file+1] % 2 == 0:
-                    legal_moves.append(((rank-1),(file+1)))
-
-            if rank-1 > -1 and rank-1 < 8 and file-1 > -1 and file-1 < 8:
-                if self.board[rank-1][file-1] != 0 and self.board[rank-1][file-1] % 2 == 0:
-                    legal_moves.append(((rank-1),(file-1)))
-        
         # LEGAL MOVES FOR BLACK
         elif color == 'b':
-            # allows pawns to move 2 squares on their first move.
-            if rank == 1 and self.board[3][file] == 0: #check if indexing is right here
-                legal_moves.append((3, file))
-            
-            # if the square infront of a pawn is empty, it can move there
-            if rank+1 < 8:
-                if self.board[rank+1][file] == 0:
-                    legal_moves.append(((rank+1), file))
-
-            # check if left or right diagonal captures are possible
-            if rank+1 > -1 and rank+1 < 8 and file+1 > -1 and file+1 < 8:
-                if self.board[rank+1][file+1] != 0 and self.board[rank+1][file+1] % 2 == 1:
-                    legal_moves.append(((rank+1),(file+1)))
-
-
-            if rank+1 > -1 and rank+1 < 8 and file-1 > -1 and file-1 < 8:
-                if self.board[rank+1][file-1] != 0 and self.board[rank+1][file-1] % 2 == 1:
-                    legal_moves.append(((rank+1),(file-1)))
+            pushes = (1 << (sq + 8)) & empty if rank < 7 else 0
+            if rank == 1 and pushes:
+                pushes |= (1 << (sq + 16)) & empty
+            captures = PAWN_ATTACKS[0][sq] & (self.occupancy[1] | ep_bit)
 
         else:
             return ValueError("wrong color argument")
-        return legal_moves
+        return bits_to_squares(pushes | captures)
+
+    def own_pieces(self, color):
+        return self.occupancy[1] if color == 'w' else self.occupancy[0]
 
     def legal_rook_moves(self, color, rank, file):
-        
-        legal_moves = []
-        # downwards
-        counter = 1
-        while rank+counter < 8:
-            if self.board[rank + counter][file] == 0:
-                legal_moves.append((rank+counter,file))
-            elif color == 'w' and self.board[rank + counter][file] % 2 == 0:
-                legal_moves.append((rank+counter,file))
-                break
-            elif color == 'b' and self.board[rank + counter][file] % 2 == 1:
-                legal_moves.append((rank+counter,file))
-                break
-            else:
-                break
-            counter += 1
-
-        # upwards
-        counter = 1
-        while rank-counter > -1:
-            if self.board[rank - counter][file] == 0:
-                legal_moves.append((rank-counter,file))
-            elif color == 'w' and self.board[rank - counter][file] % 2 == 0:
-                legal_moves.append((rank-counter,file))
-                break
-            elif color == 'b' and self.board[rank - counter][file] % 2 == 1:
-                legal_moves.append((rank-counter,file))
-                break
-            else:
-                break
-            counter += 1
-        
-        # right
-        counter = 1
-        while file+counter < 8:
-            if self.board[rank][file + counter] == 0:
-                legal_moves.append((rank,(file+counter)))
-            elif color == 'w' and self.board[rank][file + counter] % 2 == 0:
-                legal_moves.append((rank,(file+counter)))
-                break
-            elif color == 'b' and self.board[rank][file + counter] % 2 == 1:
-                legal_moves.append((rank,(file+counter)))
-                break
-            else:
-                break
-            counter += 1
-
-        # left
-        counter = 1
-        while file-counter > -1:
-            if self.board[rank][file - counter] == 0:
-                legal_moves.append((rank,(file-counter)))
-            elif color == 'w' and self.board[rank][file - counter] % 2 == 0:
-                legal_moves.append((rank,(file-counter)))
-                break
-            elif color == 'b' and self.board[rank][file - counter] % 2 == 1:
-                legal_moves.append((rank,(file-counter)))
-                break
-            else:
-                break
-            counter += 1
-            
-        return legal_moves
+        occupied = self.occupancy[0] | self.occupancy[1]
+        return bits_to_squares(rook_attacks(square(rank, file), occupied) & ~self.own_pieces(color))
 
     def legal_bishop_moves(self, color, rank, file):
-        
-        legal_moves = []
-
-        # diagonal from piece to top-left
-        counter = 1
-        while rank-counter > -1 and rank-counter < 8 and file-counter > -1 and file-counter < 8:
-            if self.board[rank - counter][file - counter] == 0:
-                legal_moves.append((rank-counter,file-counter))
-            elif color == 'w' and self.board[rank - counter][file - counter] % 2 == 0:
-                legal_moves.append((rank-counter,file-counter))
-                break
-            elif color == 'b' and self.board[rank - counter][file - counter] % 2 == 1:
-                legal_moves.append((rank-counter,file-counter))
-                break
-            else:
-                break
-            counter += 1
-        
-        # diagonal from piece to top-right
-        counter = 1
-        while rank-counter > -1 and rank-counter < 8 and file+counter > -1 and file+counter < 8:
-            if self.board[rank - counter][file + counter] == 0:
-                legal_moves.append((rank-counter,file+counter))
-            elif color == 'w' and self.board[rank - counter][file + counter] % 2 == 0:
-                legal_moves.append((rank-counter,file+counter))
-                break
-            elif color == 'b' and self.board[rank - counter][file + counter] % 2 == 1:
-                legal_moves.append((rank-counter,file+counter))
-                break
-            else:
-                break
-            counter += 1
-        
-        # diagonal from piece to bottom-left
-        counter = 1
-        while rank+counter > -1 and rank+counter < 8 and file+counter > -1 and file+counter < 8:
-            if self.board[rank + counter][file + counter] == 0:
-                legal_moves.append((rank+counter,file+counter))
-            elif color == 'w' and self.board[rank + counter][file + counter] % 2 == 0:
-                legal_moves.append((rank+counter,file+counter))
-                break
-            elif color == 'b' and self.board[rank + counter][file + counter] % 2 == 1:
-                legal_moves.append((rank+counter,file+counter))
-                break
-            else:
-                break
-            counter += 1
-        
-        # diagonal from piece to bottom-right
-        counter = 1
-        while rank+counter > -1 and rank+counter < 8 and file-counter > -1 and file-counter < 8:
-            if self.board[rank + counter][file - counter] == 0:
-                legal_moves.append((rank+counter,file-counter))
-            elif color == 'w' and self.board[rank + counter][file - counter] % 2 == 0:
-                legal_moves.append((rank+counter,file-counter))
-                break
-            elif color == 'b' and self.board[rank + counter][file - counter] % 2 == 1:
-                legal_moves.append((rank+counter,file-counter))
-                break
-            else:
-                break
-            counter += 1
-
-        return legal_moves
+        occupied = self.occupancy[0] | self.occupancy[1]
+        return bits_to_squares(bishop_attacks(square(rank, file), occupied) & ~self.own_pieces(color))
 
     def legal_knight_moves(self, color, rank, file):
-        legal_moves = []
-        offsets = [(2,1),(2,-1),(1,-2),(1,2),(-1,2),(-1,-2),(-2,1),(-2,-1)]
-        for x, y in offsets:
-            if rank+x > -1 and rank+x < 8 and file+y > -1 and file+y < 8:
-                if self.board[rank+x][file+y] == 0:
-                    legal_moves.append((rank+x,file+y))
-                elif color == 'w' and self.board[rank+x][file+y] % 2 == 0:
-                    legal_moves.append((rank+x,file+y))
-                elif color == 'b' and self.board[rank+x][file+y] % 2 == 1:
-                    legal_moves.append((rank+x,file+y))
-                else:
-                    continue
-        
-        return legal_moves
+        return bits_to_squares(KNIGHT_ATTACKS[square(rank, file)] & ~self.own_pieces(color))
 
     def legal_king_moves(self, color, rank, file):
         # get the legal king moves.  Note, this doesn't check whether the king will be in check from a move.
-        legal_moves = []
-        offsets = [(-1,0),(-1,1),(0,1),(1,1),(1,0),(1,-1),(0,-1),(-1,-1)]
-        for x, y in offsets:
-            if (rank+x > -1 and rank+x < 8) and (file+y > -1 and file+y < 8):
-                if self.board[rank+x][file+y] == 0: 
-                    legal_moves.append((rank+x,file+y))
-                elif color == 'w' and self.board[rank+x][file+y] % 2 == 0:
-                    legal_moves.append((rank+x,file+y))
-                elif color == 'b' and self.board[rank+x][file+y] % 2 == 1:
-                    legal_moves.append((rank+x,file+y))
-                else:
-                    continue
-        
-        return legal_moves
+        return bits_to_squares(KING_ATTACKS[square(rank, file)] & ~self.own_pieces(color))
 
     def verify_move(self, r1, f1, r2, f2):
-        # given a psuedolegal move, go through every psuedolegal move of the opponent to see if it results in a capture of the king.
-        # If it does, the move is not a legal move.
-        color = self.board[r1][f1] % 2
-        opponent_responses = []
-        resulting_board = get_board_from_move(self, r1, f1, r2, f2) # get the board resulting from a psuedolegal move
-        # check every opponent response in the resulting board.  If any of the results end up with the king being captured, return false.
-        for rank in range(8):
-            for file in range(8):
-                if resulting_board.board[rank][file] != 0 and resulting_board.board[rank][file] % 2 != color:
-                    opponent_responses += resulting_board.get_psuedolegal_moves(rank, file)
-
-        try:
-            king_rank, king_file = resulting_board.find_king(color)
-        except IndexError:
-            return True
-
-        return False if (king_rank, king_file) in opponent_responses else True
+        # given a psuedolegal move, check whether it leaves the mover's own king attacked.
+        # If it does, the move is not a legal move.  The move is played on this board and taken back again before returning.
+        color = 1 if self.board[r1][f1] % 2 == 1 else 0
+        self.make_move(encode_move(square(r1, f1), square(r2, f2)))
+        legal = not self.in_check(color)
+        self.unmake_move()
+        return legal
+
+    def attackers_to(self, sq, by_color, occupied=None):
+        # returns a bitboard of every piece of by_color attacking the square sq.  occupied can be passed in to
+        # look through pieces that are about to move (e.g. the king stepping away from a slider).
+        by_color = 1 if by_color == 'w' or by_color == 1 else 0
+        if occupied is None:
+            occupied = self.occupancy[0] | self.occupancy[1]
+        bb = self.bitboards
+        o = 1 - by_color # black piece codes are one higher than the white ones
+        queens = bb[3 + o]
+        return ((PAWN_ATTACKS[1 - by_color][sq] & bb[11 + o]) | (KNIGHT_ATTACKS[sq] & bb[7 + o]) | (KING_ATTACKS[sq] & bb[1 + o])
+                | (bishop_attacks(sq, occupied) & (bb[5 + o] | queens)) | (rook_attacks(sq, occupied) & (bb[9 + o] | queens)))
+
+    def is_square_attacked(self, sq, by_color, occupied=None):
+        return self.attackers_to(sq, by_color, occupied) != 0
+
+    def pins_and_checkers(self, color):
+        # finds the pieces giving check to color's king and the pieces of color that are pinned to their king.
+        # returns (checkers, pinned, pin_rays), where pin_rays[square] is the line a pinned piece on that square may still move along.
+        color = 1 if color == 'w' or color == 1 else 0
+        bb = self.bitboards
+        kings = bb[2 - color]
+        if not kings:
+            return 0, 0, {}
+        king_sq = lsb_square(kings)
+        them = 1 - color
+        o = color # piece code offset of the opponent
+        checkers = self.attackers_to(king_sq, them)
+
+        # sliders that would attack the king if the pieces of color weren't there
+        occupied = self.occupancy[0] | self.occupancy[1]
+        snipers = ((rook_attacks(king_sq, self.occupancy[them]) & (bb[9 + o] | bb[3 + o]))
+                   | (bishop_attacks(king_sq, self.occupancy[them]) & (bb[5 + o] | bb[3 + o])))
+        pinned = 0
+        pin_rays = {}
+        while snipers:
+            sniper_bit = snipers & -snipers
+            snipers ^= sniper_bit
+            sniper = sniper_bit.bit_length() - 1
+            between = BETWEEN[king_sq][sniper] & occupied
+            # exactly one piece in between, and it is ours
+            if between and between & (between - 1) == 0 and between & self.occupancy[color]:
+                pinned |= between
+                pin_rays[between.bit_length() - 1] = BETWEEN[king_sq][sniper] | sniper_bit
+        return checkers, pinned, pin_rays
 
     def in_check(self, color):
-        try:
-            king_rank, king_file = self.find_king(color)
-        except IndexError:
+        color = 1 if color == 'w' or color == 1 else 0
+        kings = self.bitboards[2 - color]
+        if not kings:
             return True
-        return not self.verify_move(king_rank, king_file, king_rank, king_file)
+        return self.is_square_attacked(lsb_square(kings), 1 - color)
 
     def in_checkmate(self, color):
-        # although this is a brute force approach, I will just loop through each possible move, for each piece of the current_move player, 
-        # and determine whether that BoardState object resulting from the move is in check or not.
-        moves = []
-        color = 1 if color == 'w' else 0
-        moves = self.get_all_legal_moves(color) # check whether it's ok that this calls get_legal_moves vs get_psuedolegal_moves
-
-        for move in moves:
-            new_board = get_board_from_move(self, move[0][0], move[0][1], move[1][0], move[1][1])
-            if not new_board.in_check(color):
-                return False
-        
-        return True
-                    
+        # checkmate - in check with no legal moves.  (no legal moves without being in check is stalemate, not checkmate)
+        return self.in_check(color) and not self.get_all_legal_moves(color)
+
     def find_king(self, color):
+        # raises an IndexError if there is no king of that color on the board
         if color == 'w' or color == 1:
-            king_pos = np.where(self.board==1)
-            return king_pos[0][0], king_pos[1][0]
+            kings = self.bitboards[1]
         elif color == 'b' or color == 0:
-            king_pos = np.where(self.board==2)
-            return king_pos[0][0], king_pos[1][0]
+            kings = self.bitboards[2]
+        if not kings:
+            raise IndexError("no king on the board")
+        sq = lsb_square(kings)
+        return sq >> 3, sq & 7
 
     def get_psuedolegal_moves(self, rank, file):
         # this function gets all the legal moves for a SINGLE PIECE indicated with rank, file.
@@ -396,32 +532,175 @@ class BoardState:
         return [] # return empty if the piece is invalid
     
     def get_legal_moves(self, rank, file):
-        psuedolegal_moves = self.get_psuedolegal_moves(rank, file)
+        # the squares (as (rank, file) tuples) the piece on (rank, file) can legally move to
+        sq = square(rank, file)
+        piece = self.squares[sq]
+        if piece == 0:
+            return []
         legal_moves = []
-        for move in psuedolegal_moves:
-            if self.verify_move(rank, file, move[0], move[1]):
-                legal_moves.append((move[0], move[1]))
+        for move in self.get_all_legal_moves(piece % 2):
+            if move & 63 == sq and SQUARES[move >> 6 & 63] not in legal_moves:
+                legal_moves.append(SQUARES[move >> 6 & 63])
         return legal_moves
 
-    def get_all_legal_moves(self, color):
-        # I will just loop through each possible move, for each piece of the current_move player, 
-        # and call get_legal_moves.  Returns moves as double tuple of start (rank, file) and end (rank, file)
-        all_legal_moves = []
-        color = 1 if color == 'w' else 0
-        for rank in range(8):
-            for file in range(8):
-                if self.board[rank][file] != 0 and self.board[rank][file] % 2 == color:
-                    psl_moves = self.get_legal_moves(rank, file)
-                    psl_moves_with_start_pos = [((rank, file),(psl_move_rank,psl_move_file)) for (psl_move_rank,psl_move_file) in psl_moves]
-                    all_legal_moves += (psl_moves_with_start_pos)
-
-        return all_legal_moves
-
-# this method doesn't alter the game state.  It just returns a board given the board in the parameter.
-# make sure this doesn't alter the game state.
-def get_board_from_move(board:BoardState, r1, f1, r2, f2):
-    board_copy = copy.deepcopy(board)
-    piece = board_copy.board[r1][f1]
-    board_copy.board[r1][f1] = 0
-    board_copy.board[r2][f2] = piece
-    return board_copy
\ No newline at end of file
+    def get_all_legal_moves(self, color, captures_only=False, moves=None):
+        # generates every legal move of color in one pass over its pieces.  The checkers and pinned pieces are found first
+        # (see pins_and_checkers), so each psuedolegal move can be accepted or rejected with a few bit operations.
+        # Returns the moves as a list of move integers (see encode_move).
+        # promotions are listed once for each piece the pawn can promote to.
+        # with captures_only, only captures and promotions are generated (for the quiescence search).
+        # moves can be a list to reuse - it is emptied and the moves are put in it, instead of in a new list.
+        color = 1 if color == 'w' or color == 1 else 0
+        them = 1 - color
+        o = 1 - color # piece code offset of color (black codes are one higher)
+        bb = self.bitboards
+        own = self.occupancy[color]
+        occupied = own | self.occupancy[them]
+        allowed = self.occupancy[them] if captures_only else ~own # the squares pieces may move to
+        if moves is None:
+            moves = []
+        else:
+            moves.clear()
+
+        checkers, pinned, pin_rays = self.pins_and_checkers(color)
+        kings = bb[1 + o]
+        king_sq = lsb_square(kings) if kings else -1
+
+        # king moves - the king is taken off the board when testing its destination, so it can't hide behind itself
+        if kings:
+            targets = KING_ATTACKS[king_sq] & allowed
+            while targets:
+                bit = targets & -targets
+                targets ^= bit
+                to = bit.bit_length() - 1
+                if not self.attackers_to(to, them, occupied ^ kings):
+                    moves.append(king_sq | to << 6)
+            if not checkers and not captures_only:
+                self.add_castling_moves(moves, color, occupied)
+
+        # in double check only the king can move
+        if checkers & (checkers - 1):
+            return moves
+        # in single check the other pieces have to capture the checker or block the check
+        if checkers:
+            check_mask = checkers | BETWEEN[king_sq][lsb_square(checkers)]
+        else:
+            check_mask = FULL
+
+        for base, attacks in [(7, None), (5, bishop_attacks), (9, rook_attacks), (3, queen_attacks)]:
+            pieces = bb[base + o]
+            while pieces:
+                bit = pieces & -pieces
+                pieces ^= bit
+                sq = bit.bit_length() - 1
+                if attacks is None:
+                    targets = KNIGHT_ATTACKS[sq] & allowed & check_mask
+                else:
+                    targets = attacks(sq, occupied) & allowed & check_mask
+                if bit & pinned:
+                    targets &= pin_rays[sq]
+                while targets:
+                    to_bit = targets & -targets
+                    targets ^= to_bit
+                    moves.append(sq | (to_bit.bit_length() - 1) << 6)
+
+        self.add_pawn_moves(moves, color, occupied, check_mask, pinned, pin_rays, captures_only)
+        return moves
+
+    def add_pawn_moves(self, moves, color, occupied, check_mask, pinned, pin_rays, captures_only=False):
+        empty = ~occupied & FULL
+        if captures_only:
+            empty &= 0xFF if color == 1 else 0xFF << 56 # only pushes to the last rank (promotions)
+        enemies = self.occupancy[1 - color]
+        forward = -8 if color == 1 else 8
+        start_rank = 6 if color == 1 else 1
+        promotion_rank = 0 if color == 1 else 7
+        promotions = (PROMOTE_QUEEN << 12, PROMOTE_ROOK << 12, PROMOTE_BISHOP << 12, PROMOTE_KNIGHT << 12)
+        ep_bit = 1 << self.en_passant if self.en_passant is not None else 0
+
+        pawns = self.bitboards[12 - color]
+        while pawns:
+            bit = pawns & -pawns
+            pawns ^= bit
+            sq = bit.bit_length() - 1
+            targets = (1 << (sq + forward)) & empty
+            if targets and sq >> 3 == start_rank:
+                targets |= (1 << (sq + 2 * forward)) & empty
+            targets |= PAWN_ATTACKS[color][sq] & enemies
+            targets &= check_mask
+            if bit & pinned:
+                targets &= pin_rays[sq]
+            while targets:
+                to_bit = targets & -targets
+                targets ^= to_bit
+                move = sq | (to_bit.bit_length() - 1) << 6
+                if move >> 9 & 7 == promotion_rank:
+                    moves += [move | promotion for promotion in promotions]
+                else:
+                    moves.append(move)
+
+            # en passant removes two pieces from the same rank, which the pin test above doesn't cover, so it is
+            # checked by playing it out.  It is rare enough that this doesn't matter.
+            if PAWN_ATTACKS[color][sq] & ep_bit:
+                move = sq | self.en_passant << 6
+                self.make_move(move)
+                if not self.in_check(color):
+                    moves.append(move)
+                self.unmake_move()
+
+    def add_castling_moves(self, moves, color, occupied):
+        # the king may not castle out of check (checked by the caller), through an attacked square or into check.
+        if color == 1:
+            rank, kingside, queenside, rook = 7, WHITE_KINGSIDE, WHITE_QUEENSIDE, 9
+        else:
+            rank, kingside, queenside, rook = 0, BLACK_KINGSIDE, BLACK_QUEENSIDE, 10
+        if self.squares[square(rank, 4)] != 2 - color:
+            return
+        if (self.castling & kingside and self.bitboards[rook] >> square(rank, 7) & 1
+                and not occupied & ((1 << square(rank, 5)) | (1 << square(rank, 6)))
+                and not self.is_square_attacked(square(rank, 5), 1 - color)
+                and not self.is_square_attacked(square(rank, 6), 1 - color)):
+            moves.append(square(rank, 4) | square(rank, 6) << 6)
+        if (self.castling & queenside and self.bitboards[rook] >> square(rank, 0) & 1
+                and not occupied & ((1 << square(rank, 1)) | (1 << square(rank, 2)) | (1 << square(rank, 3)))
+                and not self.is_square_attacked(square(rank, 3), 1 - color)
+                and not self.is_square_attacked(square(rank, 2), 1 - color)):
+            moves.append(square(rank, 4) | square(rank, 2) << 6)
+
+# moves in coordinate notation (the from and to squares, plus the piece for a promotion), e.g. e2e4 or e7e8q.
+# this is how moves are written in UCI and in perft output.
+def move_to_str(move):
+    text = square_name(move & 63) + square_name(move >> 6 & 63)
+    if move >> 12:
+        text += ' qbnr'[move >> 12]
+    return text
+
+# returns the legal move written as text on the board, or None if there isn't one
+def parse_move(board:BoardState, text:str):
+    text = text.strip().lower()
+    for move in board.get_all_legal_moves(board.current_move):
+        if move_to_str(move) == text:
+            return move
+    return None
+
+# EPD operations are an opcode and its operands (possibly quoted), ended by a semicolon
+EPD_OPERATION = re.compile(r'([A-Za-z]\w*)((?:\s+(?:"[^"]*"|[^\s;"]+))*)\s*;')
+
+# reads a line of an EPD file (four position fields followed by operations like bm Qg6; id "WAC.001";) or a FEN line.
+# returns (board state, operations dict).  The hmvc and fmvn operations set the move clocks.
+def parse_epd(line:str):
+    fields = line.split(None, 4)
+    rest = fields[4] if len(fields) > 4 else ''
+    clocks = rest.split()
+    if len(clocks) >= 2 and clocks[0].isdigit() and clocks[1].isdigit(): # a FEN line
+        return BoardState(line), {}
+    board = BoardState(' '.join(fields[:4]))
+    operations = {}
+    for opcode, operand in EPD_OPERATION.findall(rest):
+        operands = re.findall(r'"([^"]*)"|(\S+)', operand)
+        operations[opcode] = ' '.join(quoted or plain for quoted, plain in operands)
+    if operations.get('hmvc', '').isdigit():
+        board.hm_clock = int(operations['hmvc'])
+    if operations.get('fmvn', '').isdigit():
+        board.fm_clock = int(operations['fmvn'])
+    return board, operations
@@ -0,0 +1,116 @@
+# ordering - sorts the moves of a node so the ones most likely to cause an alpha/beta cutoff are searched first.
+# Alpha/beta pruning only cuts off the rest of a node once a good enough move has been searched, so the sooner the best
+# move comes up, the less of the tree gets searched.  Moves are searched in this order:
+#   1. the hash move (the best move from the transposition table or the last principal variation)
+#   2. captures and promotions, most valuable victim first, then least valuable attacker (MVV-LVA)
+#   3. killer moves - quiet moves that caused a cutoff at the same ply in a sibling node
+#   4. the other quiet moves, by their history score (how often the move caused cutoffs anywhere in the tree)
+
+# piece values by piece code, used to rank captures
+PIECE_VALUES = [0, 10000, 10000, 900, 900, 300, 300, 300, 300, 500, 500, 100, 100]
+
+HASH_MOVE_SCORE = 10000000
+CAPTURE_SCORE = 1000000
+KILLER_SCORES = (900000, 800000)
+MAX_PLY = 128
+
+class MoveOrderer:
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        # killers[ply] - the last two quiet moves that caused a cutoff at that ply
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        # history[piece][square] - cutoff score of moving that piece to that square
+        self.history = [[0] * 64 for _ in range(13)]
+
+    def new_search(self):
+        # killers are only good for the positions they were found in, history is kept but decays
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        for scores in self.history:
+            for sq in range(64):
+                scores[sq] //= 2
+
+    def order(self, board, moves, ply, hash_move=None):
+        # sorts the moves in place with the most promising first, and returns them
+        killers = self.killers[ply] if ply < MAX_PLY else (None, None)
+        history = self.history
+        squares = board.squares
+
+        def move_score(move):
+            piece = squares[move & 63]
+            to_sq = move >> 6 & 63
+            victim = squares[to_sq]
+            promotion = move >> 12
+            if move == hash_move:
+                return HASH_MOVE_SCORE
+            if victim != 0 or promotion:
+                # the promotion piece's value, by its white piece code (see model.encode_move)
+                return CAPTURE_SCORE + 10 * PIECE_VALUES[victim] - PIECE_VALUES[piece] + (PIECE_VALUES[2 * promotion + 1] if promotion else 0)
+            if move == killers[0]:
+                return KILLER_SCORES[0]
+            if move == killers[1]:
+                return KILLER_SCORES[1]
+            return history[piece][to_sq]
+
+        moves.sort(key=move_score, reverse=True)
+        return moves
+
+    def record_cutoff(self, board, move, ply, depth):
+        # called when move caused a beta cutoff (before the move is made).  Captures are already searched early,
+        # so only quiet moves are remembered as killers and in the history table.
+        to_sq = move >> 6 & 63
+        if board.squares[to_sq] != 0 or move >> 12:
+            return
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+        self.history[board.squares[move & 63]][to_sq] += depth * depth
+
+# the order attackers are taken in by the static exchange evaluation: pawn, knight, bishop, rook, queen, king (white codes)
+EXCHANGE_ORDER = [11, 7, 5, 9, 3, 1]
+
+def static_exchange(board, move):
+    # static exchange evaluation - the material the side making a capture wins (or loses, if negative) once every
+    # piece attacking the destination square has recaptured, each side always recapturing with its least valuable
+    # piece and stopping when recapturing would lose material.  Pieces behind the capturers (x-rays) are included.
+    from_sq = move & 63
+    to = move >> 6 & 63
+    squares = board.squares
+    piece = squares[from_sq]
+    victim = squares[to]
+    if victim == 0 and piece >= 11 and (from_sq ^ to) & 7:
+        victim = 12 if piece == 11 else 11 # en passant
+    bitboards = board.bitboards
+    occupied = (board.occupancy[0] | board.occupancy[1]) ^ (1 << from_sq)
+
+    gains = [PIECE_VALUES[victim]]
+    attacker_value = PIECE_VALUES[piece]
+    side = 1 - piece % 2
+    while True:
+        # what the side to move would have if it captured the last capturer (speculatively - it may have nothing to capture with)
+        gains.append(attacker_value - gains[-1])
+        if max(-gains[-2], gains[-1]) < 0:
+            break # neither side can do better by continuing the exchange
+        attackers = (board.attackers_to(to, 0, occupied) | board.attackers_to(to, 1, occupied)) & occupied & board.occupancy[side]
+        if not attackers:
+            break
+        for code in EXCHANGE_ORDER:
+            least_valuable = attackers & bitboards[code + 1 - side]
+            if least_valuable:
+                least_valuable &= -least_valuable
+                occupied ^= least_valuable
+                attacker_value = PIECE_VALUES[code]
+                break
+        side = 1 - side
+
+    # each side only recaptures if it gains from it, so work back from the end of the exchange
+    # (the last, speculative entry is only used to stop early)
+    gains.pop()
+    while len(gains) > 1:
+        last = gains.pop()
+        gains[-1] = -max(-gains[-1], last)
+    return gains[0]
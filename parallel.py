@@ -0,0 +1,159 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+import ai
+from model import BoardState, move_to_str
+from ordering import MoveOrderer
+
+# parallel - searches the root moves of a board on several processes at once.
+# The first root move (the most promising one after move ordering) is searched on its own to get a bound, then the other
+# root moves are handed out one at a time to a pool of worker processes, each of which searches the board after its move
+# to depth - 1 with its own Searcher (and transposition table).  The best score found so far is shared between the
+# workers through a multiprocessing.Value, so a worker starting on a root move uses it as its alpha bound and cuts off
+# moves that can't beat it.
+# With deterministic=True the bound is fixed to the first move's score instead of the shared value, and every root
+# move gets a fresh Searcher from deterministic_searcher: plain alpha-beta, without PVS, null moves, late move
+# reductions or aspiration windows, whose results depend on the window a move is searched with.  So the result doesn't
+# depend on which worker finished first - it is the same for any number of workers - and it is the same move and score
+# as Searcher.minimax picks on one process with a deterministic_searcher() (see test_parallel.py).
+# It is a module of its own for now: the window, uci.py and the server still search on one process (see worker.py).
+#   python parallel.py --fen FEN --depth 4 --workers 4   benchmarks it with 1 to 4 workers
+
+_best_score = None # the shared best score at the root, from the root player's point of view
+_searcher = None
+
+def _init_worker(best_score):
+    global _best_score, _searcher
+    _best_score = best_score
+    _searcher = ai.Searcher()
+
+def deterministic_searcher():
+    # a fresh Searcher without the search features whose results depend on the window (PVS, null moves, late move
+    # reductions and aspiration windows), for deterministic searches - and for the single process search to compare with
+    searcher = ai.Searcher()
+    searcher.null_move = False
+    searcher.late_move_reductions = False
+    searcher.aspiration_windows = False
+    searcher.pvs = False
+    return searcher
+
+def _search_root_move(task):
+    index, board, move, depth, bound = task
+    maximizing_player = board.current_move == 0
+    deterministic = bound is not None
+    searcher = deterministic_searcher() if deterministic else _searcher
+    searcher.reset_counters()
+    searcher.deadline = None
+    searcher.follow_pv = False
+
+    # a root move is only interesting if it beats the best score so far, so that is the bound to search with
+    # (the search scores the board after the move for the opponent, see ai.Searcher.search)
+    if not deterministic:
+        bound = _best_score.value
+
+    board.make_move(move)
+    root_score = -searcher.search(board, depth - 1, -10001, -bound, 1)[0]
+    board.unmake_move()
+
+    if not deterministic:
+        with _best_score.get_lock():
+            if root_score > _best_score.value:
+                _best_score.value = root_score
+    return index, root_score if maximizing_player else -root_score, searcher.nodes
+
+class ParallelSearcher:
+    # a pool of worker processes for root-parallel searches.  Close it with close() (or use it in a with statement).
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.best_score = multiprocessing.Value('i', -10001)
+        self.pool = multiprocessing.Pool(self.workers, initializer=_init_worker, initargs=(self.best_score,))
+        self.nodes = 0
+
+    def search(self, board, depth, deterministic=False):
+        # returns (score, best_move) with the score from black's point of view (positive if black is ahead), like
+        # Searcher.minimax and iterative_deepening - not for the side to move like Searcher.search
+        maximizing_player = board.current_move == 0
+        color = 'b' if maximizing_player else 'w'
+        moves = board.get_all_legal_moves(color)
+        if not moves or depth < 1:
+            score, move = ai.Searcher().search(board, depth, -10001, 10001, 0)
+            return (score if maximizing_player else -score), move
+        moves = MoveOrderer().order(board, moves, 0)
+
+        # the workers only need the position, not the moves that led to it
+        root = board.copy()
+        root.undo_stack = []
+        self.best_score.value = -10001
+        scores = [None] * len(moves)
+
+        # the first move gets a full window, and its score is the bound for the rest
+        _, scores[0], self.nodes = self.pool.apply(_search_root_move, ((0, root, moves[0], depth, -10001 if deterministic else None),))
+        bound = scores[0] if maximizing_player else -scores[0]
+        tasks = [(i, root, moves[i], depth, bound if deterministic else None) for i in range(1, len(moves))]
+        for index, score, nodes in self.pool.imap_unordered(_search_root_move, tasks):
+            scores[index] = score
+            self.nodes += nodes
+
+        # the first move (in search order) with the best score, as the single process search would pick
+        best = 0
+        for i in range(1, len(moves)):
+            if (scores[i] > scores[best]) if maximizing_player else (scores[i] < scores[best]):
+                best = i
+        return scores[best], moves[best]
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def parallel_search(board, depth, workers=None, deterministic=False):
+    with ParallelSearcher(workers) as searcher:
+        return searcher.search(board, depth, deterministic)
+
+def benchmark(fen, depth, max_workers, deterministic=False):
+    # searches the same board with 1 to max_workers processes and reports the time, nodes and speedup of each
+    results = []
+    base_time = None
+    for workers in range(1, max_workers + 1):
+        with ParallelSearcher(workers) as searcher:
+            start = time.perf_counter()
+            score, move = searcher.search(BoardState(fen), depth, deterministic)
+            elapsed = time.perf_counter() - start
+        if base_time is None:
+            base_time = elapsed
+        results.append({
+            'workers': workers,
+            'seconds': round(elapsed, 3),
+            'nodes': searcher.nodes,
+            'nps': int(searcher.nodes / elapsed) if elapsed > 0 else 0,
+            'speedup': round(base_time / elapsed, 2) if elapsed > 0 else 0.0,
+            'score': score,
+            'move': move_to_str(move) if move is not None else None,
+        })
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the root-parallel search with 1 to N worker processes.")
+    parser.add_argument('--fen', default="r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R b KQkq - 0 1")
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="the largest number of workers to try")
+    parser.add_argument('--deterministic', action='store_true', help="don't share bounds between workers")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    args = parser.parse_args()
+
+    results = benchmark(args.fen, args.depth, args.workers, args.deterministic)
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print(f"{'workers':>7} {'seconds':>8} {'nodes':>9} {'nps':>8} {'speedup':>7}  score move")
+        for r in results:
+            print(f"{r['workers']:>7} {r['seconds']:>8} {r['nodes']:>9} {r['nps']:>8} {r['speedup']:>7}  {r['score']} {r['move']}")
@@ -0,0 +1,102 @@
+import argparse
+import json
+import sys
+import time
+
+from model import BoardState, START_FEN, move_to_str
+
+# perft - counts the leaf nodes of the legal move tree to a fixed depth.  Comparing the counts with the known correct
+# values for standard test positions catches move generator bugs (castling, en passant, promotions, pins, checks),
+# and timing them measures the speed of the move generator.
+#   python perft.py                      runs the suite below and checks every count
+#   python perft.py --fen FEN --depth 3  counts one position, --divide splits the count by root move
+#   --json                               prints one JSON object per result instead of a table
+
+# (name, fen, [node counts at depth 1, 2, 3, ...], default depth for the suite)
+# from https://www.chessprogramming.org/Perft_Results
+POSITIONS = [
+    ("start", START_FEN, [20, 400, 8902, 197281, 4865609], 4),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862, 4085603], 3),
+    ("endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624], 5),
+    ("promotions", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264, 9467, 422333], 4),
+    ("talkchess", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379, 2103487], 3),
+    ("middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", [46, 2079, 89890, 3894594], 3),
+]
+
+def perft(board, depth):
+    # the number of leaf nodes depth plies below the board.  The moves at the last ply are counted, not played.
+    moves = board.get_all_legal_moves(board.current_move)
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        board.make_move(move)
+        nodes += perft(board, depth - 1)
+        board.unmake_move()
+    return nodes
+
+def divide(board, depth):
+    # the perft count below each root move, for tracking down which move a wrong count comes from
+    counts = {}
+    for move in board.get_all_legal_moves(board.current_move):
+        board.make_move(move)
+        counts[move_to_str(move)] = perft(board, depth - 1)
+        board.unmake_move()
+    return counts
+
+def run(name, fen, depth, expected=None):
+    board = BoardState(fen)
+    start = time.perf_counter()
+    nodes = perft(board, depth)
+    elapsed = time.perf_counter() - start
+    return {
+        'name': name,
+        'fen': fen,
+        'depth': depth,
+        'nodes': nodes,
+        'expected': expected,
+        'ok': expected is None or nodes == expected,
+        'seconds': round(elapsed, 3),
+        'nps': int(nodes / elapsed) if elapsed > 0 else 0,
+    }
+
+def run_suite(max_depth=None):
+    results = []
+    for name, fen, counts, default_depth in POSITIONS:
+        depth = min(max_depth or default_depth, len(counts))
+        results.append(run(name, fen, depth, counts[depth - 1]))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Move generator correctness and speed test.")
+    parser.add_argument('--fen', help="count this position instead of running the suite")
+    parser.add_argument('--depth', type=int, help="search depth (the suite uses a default depth for each position)")
+    parser.add_argument('--divide', action='store_true', help="print the count for each root move")
+    parser.add_argument('--json', action='store_true', help="print results as JSON lines")
+    args = parser.parse_args()
+
+    if args.fen and args.divide:
+        counts = divide(BoardState(args.fen), args.depth or 1)
+        if args.json:
+            print(json.dumps({'fen': args.fen, 'depth': args.depth or 1, 'divide': counts, 'nodes': sum(counts.values())}))
+        else:
+            for move, nodes in counts.items():
+                print(f"{move}: {nodes}")
+            print(f"\nnodes: {sum(counts.values())}")
+        return 0
+
+    results = [run('custom', args.fen, args.depth or 1)] if args.fen else run_suite(args.depth)
+    total_nodes = sum(r['nodes'] for r in results)
+    total_seconds = sum(r['seconds'] for r in results)
+    for r in results:
+        if args.json:
+            print(json.dumps(r))
+        else:
+            status = '' if r['expected'] is None else ('ok' if r['ok'] else f"FAIL (expected {r['expected']})")
+            print(f"{r['name']:<12} depth {r['depth']}  {r['nodes']:>9} nodes  {r['seconds']:>7.3f}s  {r['nps']:>7} nps  {status}")
+    if not args.json:
+        print(f"{'total':<12}          {total_nodes:>9} nodes  {total_seconds:>7.3f}s  {int(total_nodes / total_seconds) if total_seconds else 0:>7} nps")
+    return 0 if all(r['ok'] for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
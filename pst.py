@@ -0,0 +1,105 @@
+import numpy as np
+
+# pst - piece values and piece-square tables used by the evaluation.
+# A piece-square table gives a bonus (or penalty) for a piece standing on each square, e.g. knights in the center or
+# pawns close to promotion.  The tables are written from white's point of view with the 8th rank first, the same
+# layout as the board array, and mirrored for black.  (Tables from the "Simplified Evaluation Function" on the chess programming wiki)
+
+# the various piece values and associated integer codes
+# pawn value = 100, 11/12
+# bishop value = 300, 5/6
+# knight value = 300, 7/8
+# rook value = 500, 9/10
+# queen value = 900, 3/4
+# the king isn't given a value since both kings are always on the board.
+PIECE_VALUES = [0, 0, 0, 900, 900, 300, 300, 300, 300, 500, 500, 100, 100]
+
+PAWN_TABLE = [
+      0,  0,  0,  0,  0,  0,  0,  0,
+     50, 50, 50, 50, 50, 50, 50, 50,
+     10, 10, 20, 30, 30, 20, 10, 10,
+      5,  5, 10, 25, 25, 10,  5,  5,
+      0,  0,  0, 20, 20,  0,  0,  0,
+      5, -5,-10,  0,  0,-10, -5,  5,
+      5, 10, 10,-20,-20, 10, 10,  5,
+      0,  0,  0,  0,  0,  0,  0,  0]
+
+KNIGHT_TABLE = [
+    -50,-40,-30,-30,-30,-30,-40,-50,
+    -40,-20,  0,  0,  0,  0,-20,-40,
+    -30,  0, 10, 15, 15, 10,  0,-30,
+    -30,  5, 15, 20, 20, 15,  5,-30,
+    -30,  0, 15, 20, 20, 15,  0,-30,
+    -30,  5, 10, 15, 15, 10,  5,-30,
+    -40,-20,  0,  5,  5,  0,-20,-40,
+    -50,-40,-30,-30,-30,-30,-40,-50]
+
+BISHOP_TABLE = [
+    -20,-10,-10,-10,-10,-10,-10,-20,
+    -10,  0,  0,  0,  0,  0,  0,-10,
+    -10,  0,  5, 10, 10,  5,  0,-10,
+    -10,  5,  5, 10, 10,  5,  5,-10,
+    -10,  0, 10, 10, 10, 10,  0,-10,
+    -10, 10, 10, 10, 10, 10, 10,-10,
+    -10,  5,  0,  0,  0,  0,  5,-10,
+    -20,-10,-10,-10,-10,-10,-10,-20]
+
+ROOK_TABLE = [
+      0,  0,  0,  0,  0,  0,  0,  0,
+      5, 10, 10, 10, 10, 10, 10,  5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+      0,  0,  0,  5,  5,  0,  0,  0]
+
+QUEEN_TABLE = [
+    -20,-10,-10, -5, -5,-10,-10,-20,
+    -10,  0,  0,  0,  0,  0,  0,-10,
+    -10,  0,  5,  5,  5,  5,  0,-10,
+     -5,  0,  5,  5,  5,  5,  0, -5,
+      0,  0,  5,  5,  5,  5,  0, -5,
+    -10,  5,  5,  5,  5,  5,  0,-10,
+    -10,  0,  5,  0,  0,  0,  0,-10,
+    -20,-10,-10, -5, -5,-10,-10,-20]
+
+KING_TABLE = [
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -20,-30,-30,-40,-40,-30,-30,-20,
+    -10,-20,-20,-20,-20,-20,-20,-10,
+     20, 20,  0,  0,  0,  0, 20, 20,
+     20, 30, 10,  0,  0, 10, 30, 20]
+
+def _piece_square_scores():
+    # SCORE[piece][square] - what a piece on a square adds to the evaluation (value plus table bonus),
+    # positive for black pieces and negative for white pieces, since the AI plays black.
+    tables = [None, KING_TABLE, QUEEN_TABLE, BISHOP_TABLE, KNIGHT_TABLE, ROOK_TABLE, PAWN_TABLE] # by (piece + 1) // 2
+    scores = [[0] * 64]
+    for piece in range(1, 13):
+        table = tables[(piece + 1) // 2]
+        if piece % 2 == 1: # white
+            scores.append([-(PIECE_VALUES[piece] + table[sq]) for sq in range(64)])
+        else: # black - the table is flipped vertically
+            scores.append([PIECE_VALUES[piece] + table[sq ^ 56] for sq in range(64)])
+    return scores
+
+SCORE = _piece_square_scores()
+
+# SCORE as a (13, 64) array, for evaluating many boards at once
+SCORE_ARRAY = np.array(SCORE, dtype=np.int32)
+SQUARE_INDEX = np.arange(64)
+
+def score_boards(boards):
+    # evaluates many boards at once: boards is a sequence of 8x8 board arrays (or an (N, 8, 8) array).
+    # returns an array of the N scores.  Each square's piece code picks a row of SCORE_ARRAY and the square picks the
+    # column, so the whole batch is one lookup and one sum.
+    pieces = np.asarray(boards, dtype=np.intp).reshape(-1, 64)
+    return SCORE_ARRAY[pieces, SQUARE_INDEX].sum(axis=1)
+
+def score_board(board):
+    # computes the evaluation of a board state from scratch (BoardState keeps it up to date incrementally after that)
+    return int(score_boards(board.board)[0])
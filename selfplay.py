@@ -0,0 +1,347 @@
+import argparse
+import collections
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import ai
+from analyze import read_positions
+from model import BoardState, START_FEN, move_to_str, parse_epd
+from pst import PIECE_VALUES
+
+# selfplay - plays games between two configurations of the engine to tell whether a change makes it stronger:
+#   python selfplay.py --engine name=new,depth=3 --engine name=old,depth=3,eval=material --games 1000 -o games.jsonl
+# An engine is a comma separated list of settings (see ENGINE_SETTINGS).  Each opening (a FEN/EPD file given with
+# --openings, or random openings of --random-plies moves from the start) is played twice, with each engine as white once.
+# Games are played on --workers processes and each one is written to the output as a JSON line as soon as it finishes:
+#   {"game": 0, "opening": "...", "white": "new", "black": "old", "result": "1-0", "reason": "checkmate", "plies": 87, ...}
+# A game ends on checkmate (BoardState.in_checkmate), stalemate, the fifty move rule, threefold repetition, insufficient
+# material or after --max-plies plies (a draw).
+# The score of the first engine against the second is reported as an Elo difference with a 95% error margin, and a
+# sequential probability ratio test (SPRT) stops the match as soon as the results are enough to tell whether the first
+# engine is elo1 Elo stronger or only elo0 (at the error rates alpha and beta).  With --resume, the games already in the
+# output file are counted and the match carries on from there.
+
+IN_FLIGHT_PER_WORKER = 2
+
+# setting -> (type, default).  eval is 'pst' (material and piece-square tables, see pst.py) or 'material'.  pvs,
+# nullmove, lmr and aspiration turn the search features of ai.Searcher on or off, to measure what each one is worth.
+ENGINE_SETTINGS = {
+    'name': (str, None),
+    'depth': (int, 3),
+    'movetime': (float, None), # seconds per move, instead of a fixed depth
+    'hash': (int, 16),
+    'eval': (str, 'pst'),
+    'tablebases': (str, 'on'),
+    'pvs': (str, 'on'),
+    'nullmove': (str, 'on'),
+    'lmr': (str, 'on'),
+    'aspiration': (str, 'on'),
+}
+
+# engine setting -> the Searcher flag it sets
+SEARCH_FEATURES = {
+    'pvs': 'pvs',
+    'nullmove': 'null_move',
+    'lmr': 'late_move_reductions',
+    'aspiration': 'aspiration_windows',
+}
+
+def parse_engine(text):
+    # "name=new,depth=4,eval=material" -> a dict with every setting.  Raises ValueError on an unknown or bad setting.
+    engine = {name: default for name, (_, default) in ENGINE_SETTINGS.items()}
+    for setting in text.split(','):
+        name, _, value = setting.partition('=')
+        name = name.strip()
+        if name not in ENGINE_SETTINGS:
+            raise ValueError(f"unknown engine setting {name!r}")
+        engine[name] = ENGINE_SETTINGS[name][0](value.strip())
+    switches = [engine['tablebases']] + [engine[setting] for setting in SEARCH_FEATURES]
+    if engine['eval'] not in ('pst', 'material') or any(switch not in ('on', 'off') for switch in switches):
+        raise ValueError(f"bad engine settings {text!r}")
+    if engine['name'] is None:
+        engine['name'] = text
+    return engine
+
+def material(board):
+    # evaluation by material alone (positive if black is ahead, like ai.evaluate)
+    score = 0
+    for piece in range(3, 13):
+        count = board.bitboards[piece].bit_count()
+        score += PIECE_VALUES[piece] * count if piece % 2 == 0 else -PIECE_VALUES[piece] * count
+    return score
+
+def make_searcher(engine):
+    searcher = ai.Searcher(engine['hash'])
+    if engine['eval'] == 'material':
+        searcher.evaluate = material
+    if engine['tablebases'] == 'off':
+        # every tablebase lookup of the searcher goes through probe_tablebase (ai.evaluate doesn't probe)
+        searcher.probe_tablebase = lambda board, ply=0: None
+    for setting, flag in SEARCH_FEATURES.items():
+        setattr(searcher, flag, engine[setting] == 'on')
+    return searcher
+
+def insufficient_material(board):
+    # only the kings and at most one bishop or knight are left
+    bitboards = board.bitboards
+    if bitboards[3] | bitboards[4] | bitboards[9] | bitboards[10] | bitboards[11] | bitboards[12]:
+        return False
+    return (bitboards[5] | bitboards[6] | bitboards[7] | bitboards[8]).bit_count() <= 1
+
+def game_over(board, positions):
+    # (result, reason) if the game on board has ended, otherwise None.  positions counts how often each position
+    # (by zobrist hash) has been reached.
+    color = board.current_move
+    if not board.get_all_legal_moves(color):
+        if board.in_checkmate(color):
+            return ('0-1' if color == 1 else '1-0'), 'checkmate'
+        return '1/2-1/2', 'stalemate'
+    if board.hm_clock >= 100:
+        return '1/2-1/2', 'fifty moves'
+    if positions[board.zobrist] >= 3:
+        return '1/2-1/2', 'repetition'
+    if insufficient_material(board):
+        return '1/2-1/2', 'insufficient material'
+    return None
+
+def play_game(task):
+    index, opening, white, black, max_plies = task
+    board = BoardState(opening)
+    searchers = {1: make_searcher(white), 0: make_searcher(black)}
+    engines = {1: white, 0: black}
+    nodes = {1: 0, 0: 0}
+    positions = collections.Counter([board.zobrist])
+    moves = []
+    start = time.perf_counter()
+    result = game_over(board, positions) # an opening from a file can already be mate or stalemate
+    while result is None:
+        if len(moves) >= max_plies:
+            result = ('1/2-1/2', 'max plies')
+            break
+        color = board.current_move
+        engine, searcher = engines[color], searchers[color]
+        move = searcher.iterative_deepening(board, max_depth=None if engine['movetime'] else engine['depth'],
+                                            movetime=engine['movetime'])[1]
+        nodes[color] += searcher.nodes
+        board.make_move(move)
+        moves.append(move_to_str(move))
+        positions[board.zobrist] += 1
+        result = game_over(board, positions)
+    return {
+        'game': index,
+        'opening': opening,
+        'white': white['name'],
+        'black': black['name'],
+        'result': result[0],
+        'reason': result[1],
+        'plies': len(moves),
+        'moves': moves,
+        'nodes': {'white': nodes[1], 'black': nodes[0]},
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+def random_opening(rng, plies):
+    # plays plies random moves from the start position.  Tries again if the game ends on the way.
+    while True:
+        board = BoardState(START_FEN)
+        for _ in range(plies):
+            moves = board.get_all_legal_moves(board.current_move)
+            if not moves:
+                break
+            board.make_move(rng.choice(moves))
+        else:
+            if board.get_all_legal_moves(board.current_move):
+                return board.to_fen()
+
+def openings(paths, random_plies, seed):
+    # yields an endless stream of opening FENs - the positions in the files over and over, or random openings
+    if paths:
+        fens = [parse_epd(line)[0].to_fen() for _, line in read_positions(paths)]
+        if not fens:
+            raise ValueError("no positions in the opening files")
+        while True:
+            yield from fens
+    rng = random.Random(seed)
+    while True:
+        yield random_opening(rng, random_plies)
+
+def game_tasks(first, second, games, opening_fens, max_plies):
+    # two games from each opening, one with each engine as white.  Yields (index, opening, white, black, max_plies).
+    for index in range(games):
+        if index % 2 == 0:
+            opening = next(opening_fens)
+        white, black = (first, second) if index % 2 == 0 else (second, first)
+        yield index, opening, white, black, max_plies
+
+class Match:
+    # the score of the first engine (by name) against the second
+
+    def __init__(self, first, elo0=0, elo1=10, alpha=0.05, beta=0.05):
+        self.first = first
+        self.wins = self.draws = self.losses = 0
+        self.elo0, self.elo1 = elo0, elo1
+        # the SPRT stops when the log likelihood ratio leaves (lower, upper)
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+
+    def add(self, game):
+        if game['result'] == '1/2-1/2':
+            self.draws += 1
+        elif (game['result'] == '1-0') == (game['white'] == self.first):
+            self.wins += 1
+        else:
+            self.losses += 1
+
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def score(self):
+        return (self.wins + self.draws / 2) / self.games()
+
+    def elo(self):
+        # (Elo difference, 95% error margin) from the score and its spread over the games so far
+        n = self.games()
+        if n == 0:
+            return 0.0, None
+        score = self.score()
+        variance = (self.wins * (1 - score) ** 2 + self.draws * (0.5 - score) ** 2 + self.losses * score ** 2) / n
+        margin = 1.96 * math.sqrt(variance / n)
+        if score <= 0 or score >= 1:
+            return (math.inf if score >= 1 else -math.inf), None
+        elo = score_to_elo(score)
+        low, high = max(score - margin, 1e-6), min(score + margin, 1 - 1e-6)
+        return elo, (score_to_elo(high) - score_to_elo(low)) / 2
+
+    def llr(self):
+        # the log likelihood ratio of elo1 against elo0, with the game results approximated by a normal distribution
+        wins, draws, losses = self.wins, self.draws, self.losses
+        if wins == 0 or draws == 0 or losses == 0:
+            # half a game of each result keeps the spread from being zero after the first few games
+            wins, draws, losses = wins + 0.5, draws + 0.5, losses + 0.5
+        n = wins + draws + losses
+        score = (wins + draws / 2) / n
+        variance = (wins + draws / 4) / n - score ** 2
+        score0, score1 = elo_to_score(self.elo0), elo_to_score(self.elo1)
+        return (score1 - score0) * (2 * score - score0 - score1) / (2 * variance / n)
+
+    def sprt(self):
+        # 'H1' if the first engine is elo1 stronger, 'H0' if it is only elo0 stronger (or worse), None to keep playing
+        llr = self.llr()
+        if llr >= self.upper:
+            return 'H1'
+        if llr <= self.lower:
+            return 'H0'
+        return None
+
+    def summary(self):
+        elo, margin = self.elo()
+        margin = '' if margin is None else f" +- {margin:.1f}"
+        return (f"games {self.games()}: +{self.wins} ={self.draws} -{self.losses}, elo {elo:.1f}{margin}, "
+                f"LLR {self.llr():.2f} ({self.lower:.2f}, {self.upper:.2f})")
+
+def elo_to_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+def score_to_elo(score):
+    return -400 * math.log10(1 / score - 1)
+
+def read_results(path):
+    # the games already in an output file.  A last line cut off by an interruption is removed (see analyze.count_done).
+    games = []
+    if not os.path.exists(path):
+        return games
+    end = 0
+    with open(path, 'rb') as file:
+        for line in file:
+            if not line.endswith(b'\n'):
+                break
+            games.append(json.loads(line))
+            end += len(line)
+    if end != os.path.getsize(path):
+        with open(path, 'r+b') as file:
+            file.truncate(end)
+    return games
+
+def run_match(first, second, output, games, opening_fens, match, workers=None, max_plies=300, done=(), log=sys.stderr):
+    # plays the games not in done (a set of game indexes) and writes them to output until all are played or the SPRT
+    # stops the match.  Returns the SPRT result (or None).
+    workers = workers or os.cpu_count() or 1
+    tasks = (task for task in game_tasks(first, second, games, opening_fens, max_plies) if task[0] not in done)
+    decision = match.sprt()
+    pending = set()
+    with ProcessPoolExecutor(workers) as pool:
+        while decision is None:
+            for task in tasks:
+                pending.add(pool.submit(play_game, task))
+                if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                    break
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                game = future.result()
+                output.write(json.dumps(game) + '\n')
+                output.flush()
+                match.add(game)
+                print(match.summary(), file=log)
+            decision = match.sprt()
+        # the match is decided - the games still waiting to start aren't needed
+        for future in pending:
+            future.cancel()
+    return decision
+
+def main():
+    parser = argparse.ArgumentParser(description="Play two engine configurations against each other and compare their strength.")
+    parser.add_argument('--engine', action='append', required=True, help="engine settings, e.g. name=new,depth=3,eval=material (give two)")
+    parser.add_argument('--games', type=int, default=1000, help="the most games to play")
+    parser.add_argument('--openings', nargs='*', help="FEN or EPD files of opening positions")
+    parser.add_argument('--random-plies', type=int, default=8, help="length of the random openings, when no files are given")
+    parser.add_argument('--seed', type=int, default=1, help="seed for the random openings")
+    parser.add_argument('--max-plies', type=int, default=300, help="games longer than this are drawn")
+    parser.add_argument('--workers', type=int, help="number of worker processes (default: one per CPU)")
+    parser.add_argument('--elo0', type=float, default=0, help="SPRT: the Elo difference of the null hypothesis")
+    parser.add_argument('--elo1', type=float, default=10, help="SPRT: the Elo difference to look for")
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    parser.add_argument('-o', '--output', help="the JSONL file to write games to (default: stdout)")
+    parser.add_argument('--resume', action='store_true', help="count the games already in the output file and carry on")
+    args = parser.parse_args()
+    if len(args.engine) != 2:
+        parser.error("give exactly two --engine settings")
+    try:
+        first, second = parse_engine(args.engine[0]), parse_engine(args.engine[1])
+    except ValueError as error:
+        parser.error(str(error))
+    if first['name'] == second['name']:
+        parser.error("the engines need different names")
+    if args.resume and not args.output:
+        parser.error("--resume needs an --output file")
+
+    match = Match(first['name'], args.elo0, args.elo1, args.alpha, args.beta)
+    opening_fens = openings(args.openings, args.random_plies, args.seed)
+    if args.output is None:
+        decision = run_match(first, second, sys.stdout, args.games, opening_fens, match, args.workers, args.max_plies)
+    else:
+        done = set()
+        if args.resume:
+            for game in read_results(args.output):
+                done.add(game['game'])
+                match.add(game)
+        with open(args.output, 'a' if args.resume else 'w') as output:
+            decision = run_match(first, second, output, args.games, opening_fens, match, args.workers, args.max_plies, done)
+
+    print(match.summary(), file=sys.stderr)
+    if decision == 'H1':
+        print(f"SPRT: {first['name']} is stronger (elo1 = {args.elo1} accepted)", file=sys.stderr)
+    elif decision == 'H0':
+        print(f"SPRT: {first['name']} is not stronger (elo0 = {args.elo0} accepted)", file=sys.stderr)
+    else:
+        print("SPRT: no decision", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
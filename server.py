@@ -0,0 +1,290 @@
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import ai
+from book import OpeningBook
+from controller import BOOK_PATH, Game
+from model import BoardState, START_FEN, move_to_str, parse_move, parse_square
+from selfplay import game_over
+
+# server - hosts many games against the AI at once over TCP, for clients other than the pygame window:
+#   python server.py --port 8765 --workers 4
+# Clients send one JSON object per line and get one JSON object per line back.  Every request can carry an "id",
+# which is sent back with its response (responses to different games can come back in any order):
+#   {"type": "new", "time": 60, "increment": 0, "depth": null, "fen": "..."}  -> {"type": "new", "game": 1, "fen": "...", ...}
+#   {"type": "move", "game": 1, "move": "e2e4"}   -> {"type": "move", "game": 1, "move": "e2e4", "reply": "e7e5", "fen": "...", "status": "playing"}
+#   {"type": "close", "game": 1}                  -> {"type": "close", "game": 1}
+#   {"type": "stats"}                             -> {"type": "stats", "games": 12, "searching": 3, ...}
+# and {"type": "error", "error": "..."} when a request can't be done.  The client plays white and the AI plays black,
+# as in the window.  status is "playing", or the reason the game ended (see selfplay.game_over) with a "result".
+# A position sent with "new" has to pass BoardState.validate, and a human move is checked against
+# BoardState.get_legal_moves before it is played.  The AI's replies are searched on a pool of worker processes; each game
+# has its own clock for the AI ("time" seconds for the whole game plus "increment" per move, see ai.allocate_time), so
+# one game can't hold up the pool.
+# Backpressure: at most --workers * QUEUED_PER_WORKER searches are handed to the pool at once and the rest wait their
+# turn, each connection can have at most IN_FLIGHT_PER_CONNECTION requests waiting (after that the server stops reading
+# from it until one is answered), and new games are turned away once --max-games are being played.
+
+QUEUED_PER_WORKER = 2
+IN_FLIGHT_PER_CONNECTION = 16
+DEFAULT_GAME_TIME = 60
+MAX_GAME_TIME = 3600
+
+_searcher = None
+
+def _init_worker(tt_size_mb):
+    global _searcher
+    _searcher = ai.Searcher(tt_size_mb)
+
+def search(board, max_depth, time_left, increment):
+    # runs on a worker process.  Returns the AI's move and the seconds the search took.
+    start = time.monotonic()
+    move = _searcher.iterative_deepening(board, max_depth=max_depth, time_left=time_left, increment=increment)[1]
+    return move, time.monotonic() - start
+
+class Session:
+    # one game being played, and the AI's clock for it
+
+    def __init__(self, game_id, game, time_left, increment, depth, owner):
+        self.id = game_id
+        self.game = game
+        self.time_left = time_left
+        self.increment = increment
+        self.depth = depth
+        self.owner = owner # the connection that started the game
+        self.positions = collections.Counter([game.board.zobrist])
+        self.result = None # (result, reason) once the game is over
+        self.lock = asyncio.Lock() # one move at a time
+
+    def play(self, move):
+        self.game.board.make_move(move)
+        self.game.current_move = self.game.board.current_move
+        self.positions[self.game.board.zobrist] += 1
+        self.result = game_over(self.game.board, self.positions)
+
+    def state(self):
+        state = {'game': self.id, 'fen': self.game.board.to_fen(), 'status': 'playing', 'time_left': round(self.time_left, 3)}
+        if self.result is not None:
+            state['status'], state['result'] = self.result[1], self.result[0]
+        return state
+
+class GameServer:
+
+    def __init__(self, workers=None, max_games=1000, tt_size_mb=16, book_path=BOOK_PATH):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(tt_size_mb,))
+        self.search_slots = asyncio.Semaphore(self.workers * QUEUED_PER_WORKER)
+        self.max_games = max_games
+        # one opening book shared by every game, instead of a file handle for each
+        self.book = OpeningBook(book_path) if book_path is not None and os.path.exists(book_path) else None
+        self.sessions = {}
+        self.ids = itertools.count(1)
+        self.searching = 0 # searches waiting for or running on the pool
+        self.moves = 0
+        self.search_seconds = 0.0
+
+    async def handle_connection(self, reader, writer):
+        send_lock = asyncio.Lock()
+        in_flight = asyncio.Semaphore(IN_FLIGHT_PER_CONNECTION)
+        tasks = set()
+
+        async def send(message):
+            async with send_lock:
+                writer.write((json.dumps(message) + '\n').encode())
+                await writer.drain()
+
+        async def answer(request):
+            try:
+                response = await self.handle(request, writer)
+            except Exception as error:
+                response = {'type': 'error', 'error': f"{type(error).__name__}: {error}"}
+            finally:
+                in_flight.release()
+            if 'id' in request:
+                response['id'] = request['id']
+            try:
+                await send(response)
+            except ConnectionError:
+                pass
+
+        try:
+            while True:
+                await in_flight.acquire()
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("a request has to be a JSON object")
+                except ValueError as error:
+                    in_flight.release()
+                    await send({'type': 'error', 'error': f"bad request: {error}"})
+                    continue
+                task = asyncio.create_task(answer(request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            # the games of a client that has gone away can't be finished
+            for game_id in [game_id for game_id, session in self.sessions.items() if session.owner is writer]:
+                del self.sessions[game_id]
+            writer.close()
+
+    async def handle(self, request, owner):
+        kind = request.get('type')
+        if kind == 'new':
+            return await self.new_game(request, owner)
+        if kind == 'stats':
+            return self.stats()
+        session = self.sessions.get(request.get('game'))
+        if session is None or session.owner is not owner:
+            return {'type': 'error', 'error': "no such game"}
+        if kind == 'move':
+            return await self.human_move(session, request.get('move'))
+        if kind == 'close':
+            del self.sessions[session.id]
+            return {'type': 'close', 'game': session.id}
+        return {'type': 'error', 'error': f"unknown request type {kind!r}"}
+
+    async def new_game(self, request, owner):
+        if len(self.sessions) >= self.max_games:
+            return {'type': 'error', 'error': "server is full"}
+        game = Game(book_path=None)
+        game.book = self.book
+        try:
+            game.board = BoardState(request.get('fen') or START_FEN)
+            game.board.validate() # one king a side, and the side that just moved not in check
+            time_left = float(request.get('time', DEFAULT_GAME_TIME))
+            increment = float(request.get('increment', 0))
+            depth = int(request['depth']) if request.get('depth') is not None else None
+            # NaN, infinite or negative clocks would end up as the search's time limit
+            if not (math.isfinite(time_left) and time_left >= 0 and math.isfinite(increment) and increment >= 0):
+                raise ValueError("time and increment have to be finite and at least 0")
+            time_left = min(time_left, MAX_GAME_TIME)
+            if depth is not None and depth < 1:
+                raise ValueError("depth has to be at least 1")
+        except (TypeError, ValueError) as error:
+            return {'type': 'error', 'error': str(error)}
+        game.current_move = game.board.current_move
+        session = Session(next(self.ids), game, time_left, increment, depth, owner)
+        self.sessions[session.id] = session
+        response = {'type': 'new'}
+        async with session.lock:
+            session.result = game_over(game.board, session.positions)
+            if session.result is None and game.current_move == 0: # the AI (black) is to move first
+                try:
+                    response['reply'] = await self.ai_move(session)
+                except BaseException:
+                    # the client never hears of the game, so it mustn't take up a place
+                    self.sessions.pop(session.id, None)
+                    raise
+            response.update(session.state())
+        return response
+
+    async def human_move(self, session, text):
+        async with session.lock:
+            if session.result is not None:
+                return {'type': 'error', 'game': session.id, 'error': "the game is over"}
+            board = session.game.board
+            if session.game.current_move != 1:
+                return {'type': 'error', 'game': session.id, 'error': "not your move"}
+            move = self.parse_human_move(board, text)
+            if move is None:
+                return {'type': 'error', 'game': session.id, 'error': f"illegal move {text!r}"}
+            session.play(move)
+            response = {'type': 'move', 'move': move_to_str(move), 'reply': None}
+            if session.result is None:
+                response['reply'] = await self.ai_move(session)
+            response.update(session.state())
+            return response
+
+    def parse_human_move(self, board, text):
+        # the move written in coordinate notation (e2e4, e7e8q - a promotion without a piece is a queen), if it is legal
+        if not isinstance(text, str) or len(text) not in (4, 5):
+            return None
+        try:
+            from_sq, to_sq = parse_square(text[0:2]), parse_square(text[2:4])
+        except ValueError:
+            return None
+        piece = board.squares[from_sq]
+        if piece == 0 or piece % 2 != board.current_move:
+            return None
+        if (to_sq >> 3, to_sq & 7) not in board.get_legal_moves(from_sq >> 3, from_sq & 7):
+            return None
+        if piece in (11, 12) and to_sq >> 3 in (0, 7) and len(text) == 4:
+            text += 'q'
+        return parse_move(board, text)
+
+    async def ai_move(self, session):
+        # plays the AI's move in the session and returns it as text
+        move = session.game.book_move()
+        if move is None:
+            board = session.game.board.copy()
+            board.undo_stack = [] # the worker only needs the position
+            self.searching += 1
+            try:
+                async with self.search_slots:
+                    loop = asyncio.get_running_loop()
+                    move, seconds = await loop.run_in_executor(self.pool, search, board, session.depth,
+                                                               max(session.time_left, 0.01), session.increment)
+            finally:
+                self.searching -= 1
+            session.time_left = max(0.0, session.time_left - seconds + session.increment)
+            self.search_seconds += seconds
+        self.moves += 1
+        if move is None:
+            return None
+        session.play(move)
+        return move_to_str(move)
+
+    def stats(self):
+        return {
+            'type': 'stats',
+            'games': len(self.sessions),
+            'searching': self.searching,
+            'workers': self.workers,
+            'ai_moves': self.moves,
+            'mean_search_seconds': round(self.search_seconds / self.moves, 4) if self.moves else 0.0,
+        }
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+        if self.book is not None:
+            self.book.close()
+
+async def serve(host, port, workers=None, max_games=1000, tt_size_mb=16):
+    game_server = GameServer(workers, max_games, tt_size_mb)
+    server = await asyncio.start_server(game_server.handle_connection, host, port)
+    print(f"serving on {', '.join(str(socket.getsockname()) for socket in server.sockets)}", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        game_server.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Host many games against the AI over TCP (JSON lines).")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, help="number of search processes (default: one per CPU)")
+    parser.add_argument('--max-games', type=int, default=1000, help="the most games played at once")
+    parser.add_argument('--hash', type=int, default=16, help="transposition table size per worker, in MB")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_games, args.hash))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import argparse
+import mmap
+import os
+import time
+
+import numpy as np
+
+from bitboard import KING_ATTACKS, PAWN_ATTACKS, queen_attacks, rook_attacks
+
+# tablebase - endgame tablebases for king and queen, king and rook, and king and pawn against a lone king (KQK, KRK, KPK).
+# A table holds the exact result of every position with those pieces: how many plies it takes the stronger side to
+# checkmate with best play on both sides, or a draw.  The search looks positions up (Searcher.probe_tablebase) instead of
+# searching them, so these endings are played perfectly and instantly (see ai.py).
+#   python tablebase.py            generates the tables into the tablebases directory (a few seconds each)
+# The tables are made by retrograde analysis: starting from the checkmates, each pass finds the positions one ply
+# further from mate - the stronger side wins in n if one of its moves gets to a position lost in n-1, the lone king
+# loses in n if all of its moves get to positions won in n-1.  Whatever is left when a pass finds nothing new is a draw.
+# KPK needs KQK and KRK for the positions after the pawn promotes.
+#
+# File format: one byte per position, no header, the same layout for every table:
+#   index = ((strong_to_move * 64 + strong_king) * 64 + piece) * 64 + weak_king
+# with squares numbered as in bitboard.py, strong_to_move 1 if the side with the piece is to move, and the piece
+# always the white one (a position where black has the piece is looked up with the board flipped, see probe).
+# The byte is 0 for a draw (or an impossible position), otherwise 1 + the number of plies to mate.
+# A table is 512KB.  Nothing is read when the program starts: the files are memory-mapped the first time a position
+# with their pieces is probed, and the operating system reads in the pages that are looked at.
+
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablebases')
+TABLE_SIZE = 2 * 64 * 64 * 64
+
+# the tables in the order they have to be generated, and the white piece code of each.  TABLE_PIECES[code] is the
+# table for a piece of either color.
+TABLES = [('KQK', 3), ('KRK', 9), ('KPK', 11)]
+TABLE_PIECES = {code: name for name, piece in TABLES for code in (piece, piece + 1)}
+
+MATE = 10000 # the same as ai.MATE
+
+class Tablebases:
+
+    def __init__(self, directory=TABLEBASE_DIR):
+        self.directory = directory
+        self.tables = {} # name -> mmap, or None if the file isn't there
+
+    def table(self, name):
+        if name not in self.tables:
+            path = os.path.join(self.directory, name + '.tb')
+            table = None
+            if os.path.exists(path) and os.path.getsize(path) == TABLE_SIZE:
+                with open(path, 'rb') as file:
+                    table = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.tables[name] = table
+        return self.tables[name]
+
+    def probe(self, board, ply=0):
+        # the exact score of the board (positive if black is winning, like ai.evaluate) if it has a table, otherwise None.
+        # A mate n plies away is scored as a mate found ply + n plies from the root (see ai.MATE).
+        occupied = board.occupancy[0] | board.occupancy[1]
+        if occupied.bit_count() != 3 or board.castling:
+            return None
+        bitboards = board.bitboards
+        for piece in (3, 4, 9, 10, 11, 12):
+            if bitboards[piece]:
+                break
+        else:
+            return None # two kings and a bishop or knight - no table, but the search finds the draw anyway
+        table = self.table(TABLE_PIECES[piece])
+        if table is None:
+            return None
+        strong_color = piece & 1
+        strong_king = (bitboards[1] if strong_color else bitboards[2]).bit_length() - 1
+        weak_king = (bitboards[2] if strong_color else bitboards[1]).bit_length() - 1
+        piece_sq = bitboards[piece].bit_length() - 1
+        if not strong_color:
+            # flip the board so the piece is white (and a black pawn moves up the board like a white one)
+            strong_king ^= 56
+            weak_king ^= 56
+            piece_sq ^= 56
+        strong_to_move = 1 if board.current_move == strong_color else 0
+        value = table[((strong_to_move * 64 + strong_king) * 64 + piece_sq) * 64 + weak_king]
+        if value == 0:
+            return 0
+        score = MATE - ply - (value - 1)
+        return -score if strong_color else score
+
+# the tables used by the search, opened as they are needed
+tablebases = Tablebases()
+
+def probe(board, ply=0):
+    return tablebases.probe(board, ply)
+
+def _bits(bitboards):
+    # a list of bitboards as an array of booleans, [i][sq] is True if sq is set in bitboards[i]
+    return np.unpackbits(np.array(bitboards, dtype='<u8').view(np.uint8).reshape(-1, 8), axis=1, bitorder='little').astype(bool)
+
+def generate(piece, promotions=()):
+    # generates the table for the white piece with the given code against a lone king.  promotions are the
+    # (strong_to_move, weak to move) value arrays of the tables a pawn can promote into.  Returns the two arrays of plies
+    # to mate (-1 for a draw), strong to move and weak to move, both indexed [strong king, piece, weak king].
+    squares = np.arange(64)
+    king = _bits(KING_ATTACKS) # king[a, b] - a king on a attacks b
+    # attacks[p, b, d] - the piece on p attacks d when b is the only other occupied square
+    if piece == 11:
+        attacks = np.broadcast_to(_bits(PAWN_ATTACKS[1])[:, None, :], (64, 64, 64))
+    else:
+        slider = queen_attacks if piece == 3 else rook_attacks
+        attacks = _bits([slider(p, 1 << b) for p in range(64) for b in range(64)]).reshape(64, 64, 64)
+
+    # the arrays below are indexed [strong king K, piece P, weak king k] (and [..., d] for the square a move goes to)
+    K, P, k = np.ix_(squares, squares, squares)
+    legal = (K != P) & (K != k) & (P != k) & ~king[K, k]
+    if piece == 11:
+        legal &= (P >= 8) & (P < 56) # no pawns on the first or last rank
+    checked = attacks[P, K, k]
+    weak_legal = legal
+    strong_legal = legal & ~checked # the lone king can't be in check with the other side to move
+
+    # the lone king's moves: to squares the king and the piece don't attack (the piece sees through the square the
+    # king leaves).  Taking the piece is a draw, so it is an escape if the piece isn't defended.
+    weak_moves = king[None, None, :, :] & ~king[:, None, None, :] & ~attacks.transpose(1, 0, 2)[:, :, None, :]
+    captures = weak_moves[K, P, k, P]
+    weak_moves &= (squares[None, :, None, None] != squares) # the capture goes to a KK ending, not this table
+    has_moves = weak_moves.any(axis=3) | captures
+
+    # the piece's moves - a queen or rook is stopped by either king, a pawn pushes one square (two from its first rank)
+    if piece == 11:
+        piece_moves = np.zeros((64, 64, 64, 64), dtype=bool)
+        promotes = np.zeros((64, 64, 64), dtype=bool)
+        for p in range(8, 56):
+            free = (K[:, 0, :] != p - 8) & (k[0, :, :] != p - 8)
+            if p < 16:
+                promotes[:, p, :] = free
+                continue
+            piece_moves[:, p, :, p - 8] = free
+            if p >= 48:
+                piece_moves[:, p, :, p - 16] = free & (K[:, 0, :] != p - 16) & (k[0, :, :] != p - 16)
+    else:
+        # the squares a slider reaches with both kings on the board are the ones it reaches past each king on its own
+        piece_moves = attacks.transpose(1, 0, 2)[:, :, None, :] & attacks[None, :, :, :]
+        promotes = None
+
+    # a promotion wins in one more ply than the best promoted position (weak king to move) is lost in
+    promotion_plies = np.full((64, 64, 64), -1, dtype=np.int16)
+    if promotes is not None:
+        for _, promoted_weak in promotions:
+            lost = np.full((64, 64, 64), -1, dtype=np.int16)
+            lost[:, 8:16, :] = promoted_weak[:, 0:8, :]
+            lost = np.where(promotes & (lost >= 0), lost + 1, -1)
+            promotion_plies = np.where((lost >= 0) & ((promotion_plies < 0) | (lost < promotion_plies)), lost, promotion_plies)
+        promotion_plies[~strong_legal] = -1
+
+    strong = np.full((64, 64, 64), -1, dtype=np.int16)
+    weak = np.full((64, 64, 64), -1, dtype=np.int16)
+    weak[weak_legal & checked & ~has_moves] = 0 # checkmate
+
+    last_promotion = int(promotion_plies.max())
+    n = 0
+    quiet = 0 # passes in a row that found nothing
+    while quiet < 2 or n <= last_promotion:
+        n += 1
+        if n % 2:
+            lost = weak >= 0
+            wins = (piece_moves & lost.transpose(0, 2, 1)[:, None, :, :]).any(axis=3)
+            wins |= (king[:, None, None, :] & lost.transpose(1, 2, 0)[None, :, :, :]).any(axis=3)
+            wins |= promotion_plies == n
+            new = wins & strong_legal & (strong < 0)
+            strong[new] = n
+        else:
+            won = strong >= 0
+            safe = (weak_moves & ~won[:, :, None, :]).any(axis=3)
+            new = weak_legal & has_moves & ~captures & ~safe & (weak < 0)
+            weak[new] = n
+        quiet = 0 if new.any() else quiet + 1
+    return strong, weak
+
+def save(path, strong, weak):
+    # writes a table in the file format described at the top
+    values = np.stack([weak, strong]) + 1
+    values.astype(np.uint8).tofile(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the KQK, KRK and KPK endgame tablebases.")
+    parser.add_argument('--dir', default=TABLEBASE_DIR, help="where to write the tables")
+    args = parser.parse_args()
+    os.makedirs(args.dir, exist_ok=True)
+    generated = {}
+    for name, piece in TABLES:
+        start = time.perf_counter()
+        promotions = [generated['KQK'], generated['KRK']] if piece == 11 else []
+        strong, weak = generate(piece, promotions)
+        generated[name] = (strong, weak)
+        save(os.path.join(args.dir, name + '.tb'), strong, weak)
+        print(f"{name}: {int((strong >= 0).sum())} wins, longest mate {int(strong.max())} plies, "
+              f"{time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import random
+import unittest
+
+from model import BoardState, START_FEN
+from parallel import ParallelSearcher, deterministic_searcher
+
+# regression test for parallel.py: a deterministic root-parallel search picks the same move and score as the single
+# process search with the same settings (see parallel.deterministic_searcher):
+#   python -m unittest test_parallel      (or python -m pytest test_parallel.py)
+
+POSITIONS = [
+    START_FEN,
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    # gave a different move and score once null moves and late move reductions were on in the workers
+    '1rbq3r/p1pp1k1p/1pn2p1n/2b1p1pN/8/4PQP1/PPPP1PKP/RNBB1R2 b - - 9 10',
+]
+
+def random_positions(count, seed):
+    # positions from random games of 6 to 30 plies, with a move to play
+    rng = random.Random(seed)
+    fens = []
+    while len(fens) < count:
+        board = BoardState(START_FEN)
+        for _ in range(rng.randint(6, 30)):
+            moves = board.get_all_legal_moves(board.current_move)
+            if not moves:
+                break
+            board.make_move(rng.choice(moves))
+        if board.get_all_legal_moves(board.current_move):
+            fens.append(board.to_fen())
+    return fens
+
+class DeterministicTest(unittest.TestCase):
+
+    def test_same_as_single_process(self):
+        fens = POSITIONS + random_positions(12, seed=7)
+        with ParallelSearcher(2) as searcher:
+            for i, fen in enumerate(fens):
+                depth = 3 if i % 2 else 4
+                board = BoardState(fen)
+                single = deterministic_searcher().minimax(board, depth, -10001, 10001, board.current_move == 0)
+                self.assertEqual(searcher.search(BoardState(fen), depth, deterministic=True), single[:2], fen)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import asyncio
+import unittest
+
+from server import GameServer
+
+# regression tests for server.py's handling of new games:
+#   python -m unittest test_server      (or python -m pytest test_server.py)
+# The searches these make are tiny (depth 1), so they run in a second or two.
+
+BAD_POSITIONS = [
+    '4k3/8/8/8/8/8/8/r3K3 b - - 0 1',  # white is in check with black to move - the AI would capture the king
+    '4k3/8/8/8/8/8/8/R7 b - - 0 1',    # no white king
+    '8/8/8/8/8/8/8/8 w - - 0 1',       # no kings at all
+    '4k3/8/8/8/8/8/8/3KK3 w - - 0 1',  # two white kings
+]
+
+class NewGameTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.server = GameServer(workers=1, max_games=2, book_path=None)
+
+    def tearDown(self):
+        self.server.close()
+        self.loop.close()
+
+    def new_game(self, **request):
+        return self.loop.run_until_complete(self.server.new_game(dict(type='new', **request), owner=None))
+
+    def test_bad_positions_are_rejected(self):
+        for fen in BAD_POSITIONS:
+            response = self.new_game(fen=fen, depth=1)
+            self.assertEqual(response['type'], 'error', fen)
+        self.assertEqual(self.server.sessions, {})
+
+    def test_good_position_is_played(self):
+        response = self.new_game(fen='4k3/8/8/8/8/8/8/R3K3 b - - 0 1', depth=1)
+        self.assertEqual(response['type'], 'new')
+        self.assertEqual(response['status'], 'playing')
+        self.assertIsNotNone(response['reply'])
+        self.assertEqual(list(self.server.sessions), [response['game']])
+
+    def test_failed_ai_move_leaves_no_session(self):
+        async def broken_ai_move(session):
+            raise RuntimeError("search failed")
+        self.server.ai_move = broken_ai_move
+        for _ in range(self.server.max_games):
+            with self.assertRaises(RuntimeError):
+                self.new_game(fen='4k3/8/8/8/8/8/8/R3K3 b - - 0 1', depth=1)
+        self.assertEqual(self.server.sessions, {})
+        # the failed games don't count towards max_games
+        del self.server.ai_move
+        self.assertEqual(self.new_game(depth=1)['type'], 'new')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+# transposition - a fixed size table remembering the results of earlier searches, indexed by the zobrist hash of the board.
+# The same board state is often reached through different move orders, so a search can reuse the score (or at least
+# the best move) it found the last time it saw the board.
+
+# bound types - whether a stored score is exact or only a bound on the real score (after an alpha/beta cutoff)
+EXACT = 0
+LOWER = 1 # the real score is at least the stored score (the search failed high)
+UPPER = 2 # the real score is at most the stored score (the search failed low)
+
+# rough memory cost of one entry: the list slot, the entry tuple and the integers in it
+ENTRY_SIZE = 120
+
+class TranspositionTable:
+
+    def __init__(self, size_mb=16):
+        # the number of entries is the largest power of two that fits in the memory budget, so the index is a bit mask
+        entries = max(1, int(size_mb * 1024 * 1024 // ENTRY_SIZE))
+        self.size = 1 << (entries.bit_length() - 1)
+        self.mask = self.size - 1
+        self.clear()
+
+    def clear(self):
+        # entries - each slot is None or a tuple (key, depth, score, bound, best_move, generation)
+        self.entries = [None] * self.size
+        self.generation = 0
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def new_search(self):
+        # entries from earlier searches are kept, but they are the first to be replaced
+        self.generation += 1
+
+    def probe(self, key):
+        # returns the entry for the board hash, or None
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, score, bound, best_move):
+        # replacement policy: always replace an entry for the same board or from an older search,
+        # otherwise keep whichever entry was searched deeper.
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is None:
+            self.used += 1
+        elif entry[0] != key and entry[5] == self.generation and entry[1] > depth:
+            return
+        elif entry[0] == key and best_move is None:
+            best_move = entry[4] # keep the old best move when a fail low doesn't find a new one
+        self.entries[index] = (key, depth, score, bound, best_move, self.generation)
+        self.stores += 1
+
+    def hashfull(self):
+        # how full the table is, in permille (as reported by UCI engines)
+        return self.used * 1000 // self.size
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            'size': self.size,
+            'used': self.used,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / probes if probes else 0.0,
+            'stores': self.stores,
+            'hashfull': self.hashfull(),
+        }
@@ -0,0 +1,202 @@
+import queue
+import sys
+import threading
+
+import ai
+from model import BoardState, START_FEN, move_to_str, parse_move
+from worker import AIWorker
+
+# uci - runs the engine without the GUI, talking the UCI protocol (https://www.wbec-ridderkerk.nl/html/UCIProtocol.html)
+# on stdin/stdout, so it can be used from chess GUIs, tournament managers and analysis tools:
+#   python uci.py
+# Supported commands: uci, isready, ucinewgame, setoption name Hash value <mb>, position [startpos | fen <fen>] [moves ...],
+# go [depth <n>] [movetime <ms>] [wtime <ms>] [btime <ms>] [winc <ms>] [binc <ms>] [infinite], stop, quit.
+# The search runs on a worker thread (see worker.py) so stop and isready are answered while it searches.
+
+ENGINE_NAME = "Chess"
+ENGINE_AUTHOR = "raykeating"
+DEFAULT_HASH_MB = 16
+
+def uci_score(score, black_to_move):
+    # UCI scores are from the side to move's point of view, in centipawns or in moves to mate
+    if not black_to_move:
+        score = -score
+    if score > ai.MATE_THRESHOLD:
+        return f"mate {(ai.MATE - score + 1) // 2}"
+    if score < -ai.MATE_THRESHOLD:
+        return f"mate {-((ai.MATE + score + 1) // 2)}"
+    return f"cp {score}"
+
+class UCIEngine:
+
+    def __init__(self, output=print):
+        self.output = output
+        self.hash_mb = DEFAULT_HASH_MB
+        self.worker = AIWorker(ai.Searcher(self.hash_mb))
+        self.board = BoardState(START_FEN)
+        self.searching = False
+        self.infinite = False
+        self.pending_bestmove = None # a bestmove found during "go infinite" is only sent after "stop"
+        self.last_pv = []
+        self.running = True
+
+    def send(self, text):
+        self.output(text)
+
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return
+        command, args = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max 1024")
+            self.send("uciok")
+        elif command == 'isready':
+            self.send("readyok")
+        elif command == 'ucinewgame':
+            self.stop_search()
+            self.worker = AIWorker(ai.Searcher(self.hash_mb))
+            self.board = BoardState(START_FEN)
+        elif command == 'setoption':
+            self.set_option(args)
+        elif command == 'position':
+            self.set_position(args)
+        elif command == 'go':
+            self.go(args)
+        elif command == 'stop':
+            self.finish_search()
+        elif command == 'quit':
+            self.stop_search()
+            self.running = False
+        # unknown commands are ignored, as the protocol asks
+
+    def set_option(self, args):
+        # setoption name <name> value <value>
+        if 'name' not in args or 'value' not in args:
+            return
+        name = ' '.join(args[args.index('name') + 1:args.index('value')]).lower()
+        value = ' '.join(args[args.index('value') + 1:])
+        if name == 'hash' and value.isdigit() and not self.searching:
+            self.hash_mb = max(1, min(1024, int(value)))
+            self.worker = AIWorker(ai.Searcher(self.hash_mb))
+
+    def set_position(self, args):
+        if self.searching or not args:
+            return
+        if args[0] == 'startpos':
+            fen, rest = START_FEN, args[1:]
+        elif args[0] == 'fen':
+            end = args.index('moves') if 'moves' in args else len(args)
+            fen, rest = ' '.join(args[1:end]), args[end:]
+        else:
+            return
+        try:
+            board = BoardState(fen)
+            board.validate() # the search can't play from a position without both kings, or with a king left in check
+        except ValueError as error:
+            self.send(f"info string {error}")
+            return
+        # the moves are all played before the position is taken, so an illegal one leaves the last position as it was
+        if rest and rest[0] == 'moves':
+            for text in rest[1:]:
+                move = parse_move(board, text)
+                if move is None:
+                    self.send(f"info string illegal move {text}")
+                    return
+                board.make_move(move)
+        self.board = board
+
+    def go(self, args):
+        if self.searching:
+            return
+        limits = {}
+        for name in ('depth', 'movetime', 'wtime', 'btime', 'winc', 'binc'):
+            if name in args:
+                index = args.index(name)
+                if index + 1 < len(args) and args[index + 1].lstrip('-').isdigit():
+                    limits[name] = int(args[index + 1])
+        black_to_move = self.board.current_move == 0
+        time_left = limits.get('btime' if black_to_move else 'wtime')
+        increment = limits.get('binc' if black_to_move else 'winc', 0)
+
+        self.infinite = 'infinite' in args
+        self.pending_bestmove = None
+        self.last_pv = []
+        self.searching = True
+        if self.infinite:
+            self.worker.start(self.board)
+        else:
+            self.worker.start(self.board, max_depth=limits.get('depth'),
+                              movetime=limits['movetime'] / 1000 if 'movetime' in limits else None,
+                              time_left=max(0, time_left) / 1000 if time_left is not None else None,
+                              increment=increment / 1000)
+
+    def poll(self):
+        # sends what the search has reported since the last call
+        for message, value in self.worker.poll():
+            if message == 'info':
+                self.send_info(value)
+            elif message == 'bestmove':
+                if self.infinite:
+                    self.pending_bestmove = (value,)
+                else:
+                    self.send_bestmove(value)
+
+    def send_info(self, progress):
+        self.last_pv = progress['pv']
+        milliseconds = int(progress['seconds'] * 1000)
+        nps = int(progress['nodes'] / progress['seconds']) if progress['seconds'] > 0 else 0
+        pv = ' '.join(move_to_str(move) for move in progress['pv'] or [progress['move']])
+        self.send(f"info depth {progress['depth']} score {uci_score(progress['score'], self.board.current_move == 0)} "
+                  f"nodes {progress['nodes']} nps {nps} time {milliseconds} hashfull {self.worker.searcher.tt.hashfull()} pv {pv}")
+
+    def send_bestmove(self, move):
+        self.searching = False
+        self.pending_bestmove = None
+        if move is None:
+            self.send("bestmove 0000")
+        elif len(self.last_pv) > 1 and self.last_pv[0] == move:
+            self.send(f"bestmove {move_to_str(move)} ponder {move_to_str(self.last_pv[1])}")
+        else:
+            self.send(f"bestmove {move_to_str(move)}")
+
+    def finish_search(self):
+        # stops the search and waits for it, so its bestmove is sent before the next command is handled (otherwise a
+        # position or go straight after stop would find the search still running and be ignored)
+        if not self.searching:
+            return
+        self.infinite = False
+        self.worker.close()
+        self.poll()
+        if self.pending_bestmove is not None: # "go infinite" finished on its own before the stop
+            self.send_bestmove(self.pending_bestmove[0])
+
+    def stop_search(self):
+        # ends a running search, throwing its result away
+        self.worker.close()
+        self.worker.poll()
+        self.searching = False
+        self.infinite = False
+        self.pending_bestmove = None
+
+def read_commands(stream, commands):
+    # reads stdin on its own thread, so the engine can keep sending search output while it waits for input
+    for line in stream:
+        commands.put(line)
+    commands.put('quit')
+
+def main():
+    engine = UCIEngine(lambda text: print(text, flush=True))
+    commands = queue.Queue()
+    threading.Thread(target=read_commands, args=(sys.stdin, commands), daemon=True).start()
+    while engine.running:
+        try:
+            engine.handle(commands.get(timeout=0.01))
+        except queue.Empty:
+            pass
+        engine.poll()
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
+import sys
 import pygame as pg
 from controller import Game, BoardState
-from ai import evaluate
+from worker import AIWorker
 
 # General Setup
 screen = pg.display.set_mode((800,800))
@@ -27,16 +28,24 @@ piece_imgs = load_images()
 circle_img = pg.image.load("circle.png").convert_alpha()
 circle_img = pg.transform.smoothscale(circle_img, (10,10))
 
+highlight_square = pg.Surface((100,100))
+highlight_square.fill(pg.Color(255,255,0))
+highlight_square.set_alpha(80)
 
-def draw_board():
-    squares = []
+# frames per second while a piece is being dragged, and otherwise (when only the AI and clicks have to be checked for)
+FPS = 144
+IDLE_FPS = 30
+
+# Rendering: the empty board is drawn once into board_surface.  After that only the parts of the window that change
+# are drawn again (see redraw) and added to dirty_rects, and only those are sent to the display at the end of the
+# frame, so dragging a piece redraws two piece-sized rectangles instead of the whole window, and a frame where
+# nothing happens doesn't draw anything.
+dirty_rects = []
+
+def render_board():
+    surface = pg.Surface((800,800))
     dark_color = "#EDEDD2"
     light_color = "#769459"
-    
-    black_square = pg.Surface((100,100))
-    black_square.fill(pg.Color(dark_color))
-    white_square = pg.Surface((100,100))
-    white_square.fill(pg.Color(light_color))
 
     for i in range(8):
         flip = 1
@@ -45,19 +54,21 @@ def draw_board():
         for j in range(8):
             # draw the background
             if j % 2 == flip:
-                screen.blit(black_square,(j*100,i*100))
-                squares.append([black_square, black_square.get_rect(x=j*100, y=i*100)])
+                surface.fill(pg.Color(dark_color), (j*100,i*100,100,100))
             else:
-                screen.blit(white_square,(j*100,i*100))
-                squares.append([white_square, white_square.get_rect(x=j*100, y=i*100)])
-    
-    return squares
+                surface.fill(pg.Color(light_color), (j*100,i*100,100,100))
+    return surface
 
-def highlight(legal_moves:list, board:BoardState):
-    highlight_square = pg.Surface((100,100))
-    highlight_square.fill(pg.Color(255,255,0))
-    highlight_square.set_alpha(80)
+board_surface = render_board()
 
+def draw_board(area=None):
+    # copies the empty board (or the part of it inside area) to the screen
+    if area is None:
+        screen.blit(board_surface, (0,0))
+    else:
+        screen.blit(board_surface, area, area)
+
+def highlight(legal_moves:list, board:BoardState):
     try:
         for move in legal_moves:
             rank = move[1]*100
@@ -66,22 +77,41 @@ def highlight(legal_moves:list, board:BoardState):
     except TypeError:
         pass
 
-def draw_pieces(board:BoardState):
+def get_pieces(board:BoardState):
     active_pieces = []
     for i in range(8):
         for j in range(8):
             # get the integer value of the piece
             piece = board.board[i][j]
-            # draw the piece if it's not empty (0)
+            # add the piece if it's not empty (0)
             if piece > 0 and piece < 13:
                 piece_img = piece_imgs[piece-1] 
                 piece_rect = piece_img.get_rect(x=j*100, y=i*100)
                 active_pieces.append([piece, piece_img, piece_rect])
-                screen.blit(piece_img, piece_rect)  
     # active_pieces is a list of the pieces on the board.
     # Each item in the list contains the pieces int value at [0], the image (surface) at [1], and it's rect at [2] 
     return active_pieces
 
+def draw_pieces(pieces:list, area=None, lifted=None):
+    # draws the pieces that are (partly) inside area, apart from the lifted piece (the one being dragged)
+    for piece in pieces:
+        if piece is not lifted and (area is None or piece[2].colliderect(area)):
+            screen.blit(piece[1], piece[2])
+
+def redraw(area, pieces, legal_moves=None, board=None, lifted=None, hover=None):
+    # draws everything inside area again - the board, the pieces, the legal move highlights and the piece being dragged
+    # (lifted, drawn at the hover rect) - and marks it to be sent to the display.  Drawing is clipped to area, so the
+    # parts of the pieces and highlights outside it aren't touched.
+    screen.set_clip(area)
+    draw_board(area)
+    draw_pieces(pieces, area, lifted)
+    if legal_moves:
+        highlight(legal_moves, board)
+    if lifted is not None:
+        screen.blit(lifted[1], hover)
+    screen.set_clip(None)
+    dirty_rects.append(pg.Rect(area))
+
 def display_gameover_message(player):
     message_surf = pg.Surface((350,160))
     message_surf.fill(pg.Color(255,0,0))
@@ -92,12 +122,14 @@ def display_gameover_message(player):
     text_surface_bottom = small_font.render(f'{player} is in Checkmate', True, (0,0,0))
     screen.blit(text_surface_top, (275,360))
     screen.blit(text_surface_bottom, (290,410))
+    dirty_rects.append(message_rect)
 
 def run_game():
     game = Game()
 
-    squares = draw_board()
-    pieces = draw_pieces(game.board)
+    window = screen.get_rect()
+    pieces = get_pieces(game.board)
+    redraw(window, pieces)
 
     hover_piece = None
     clicked_piece = None
@@ -105,16 +137,44 @@ def run_game():
     click_pos = None
     dragging = False
 
+    # the AI thinks on a background thread, so the window keeps running while it does.  Python threads take turns
+    # holding the interpreter, so switch between them more often than the default 5ms to keep up the frame rate.
+    sys.setswitchinterval(0.001)
+    ai_worker = AIWorker()
+    ai_searching = False
+
     # main event loop
     while True:
         if game.current_move == 0: # if it's black's turn
-                game.move_piece_with_ai(depth=3)
-                draw_board()
-                pieces = draw_pieces(game.board)
+            book_move = None if ai_searching else game.book_move()
+            if book_move is not None:
+                # a book move is played straight away (a ponder search, if there is one, is thrown away)
+                ai_worker.cancel()
+                game.apply_ai_move(book_move)
+                pieces = get_pieces(game.board)
+                redraw(window, pieces)
+            elif not ai_searching:
+                # if the AI was pondering on the move that was just played, its search carries on, otherwise start one
+                if not ai_worker.ponderhit(game.board, movetime=2):
+                    ai_worker.start(game.board, movetime=2)
+                ai_searching = True
+            for message, value in ai_worker.poll():
+                if message == 'info':
+                    # show the progress of the search in the title bar
+                    pg.display.set_caption(f"Chess - thinking (depth {value['depth']}, score {value['score']})")
+                elif message == 'bestmove':
+                    ai_searching = False
+                    game.apply_ai_move(value)
+                    pg.display.set_caption('Chess')
+                    # think about the reply the AI expects while the player thinks about it
+                    ai_worker.ponder(game.board)
+                    pieces = get_pieces(game.board)
+                    redraw(window, pieces)
 
         for event in pg.event.get():
             # enable close button
             if event.type == pg.QUIT:
+                ai_worker.close()
                 pg.quit()
                 exit()
 
@@ -122,6 +182,10 @@ def run_game():
 
                 # --- DRAG AND DROP LOGIC ---
 
+                # the human plays white, and only on their own turn: while the AI is thinking (current_move is 0, or
+                # None once the game is over) the board doesn't take clicks, so black can't be moved from here
+                if game.current_move != 1 or ai_searching:
+                    continue
                 # get the click position
                 click_pos = event.pos
                 # get any pieces that are at the click position
@@ -132,7 +196,9 @@ def run_game():
                     # --- HIGHLIGHT LEGAL MOVES ---
                     if clicked_piece[0] % 2 == game.current_move: 
                         legal_moves = game.get_legal_moves(clicked_piece[2])
-                        highlight(legal_moves, game.board.board)
+                        redraw(window, pieces, legal_moves, game.board.board)
+                    # the piece is drawn at hover_piece while it is dragged, starting from its own square
+                    hover_piece = clicked_piece[2].copy()
                 else:
                     continue
 
@@ -143,8 +209,15 @@ def run_game():
                     clicked_piece = None         
 
             # when a player releases the mouse to move a piece
-            elif event.type == pg.MOUSEBUTTONUP and clicked_piece:
+            elif event.type == pg.MOUSEBUTTONUP:
                 # --- DRAG AND DROP LOGIC ---
+                # a release without a piece of the player's own picked up (e.g. after clicking the opponent's piece)
+                # just ends the drag, so the loop goes back to the idle frame rate
+                if not clicked_piece or game.current_move != 1 or ai_searching:
+                    clicked_piece = None
+                    hover_piece = None
+                    dragging = False
+                    continue
                 # if a piece has been clicked beforehand
                 if clicked_piece:
                     # get the position where the mouse was released
@@ -155,24 +228,21 @@ def run_game():
                         captured_piece = captured_pieces[0]
                         if captured_piece[0] % 2 != game.current_move: # if so, check if it is the opponent's piece (modulo because black is even, white is odd)
                             game.move_piece(click_pos[1],click_pos[0],release_pos[1], release_pos[0]) # move the piece
-                            pieces = draw_pieces(game.board) 
                         else:
                             clicked_piece = None
                             hover_piece = None
                             dragging = False
-                            draw_board()
-                            draw_pieces(game.board)
+                            redraw(window, pieces)
                             continue # if the piece has been released on a piece of their own color, don't do anything.
                     else:
                         # if there are no pieces where the mouse was released, just move it to that square.
                         game.move_piece(click_pos[1],click_pos[0],release_pos[1], release_pos[0])
-                        pieces = draw_pieces(game.board) 
                 clicked_piece = None
                 legal_moves = None
                 hover_piece = None
                 dragging = False
-                draw_board()
-                pieces = draw_pieces(game.board)
+                pieces = get_pieces(game.board)
+                redraw(window, pieces)
                 game.check_for_checkmate()
                 if game.board.black_checkmated:
                     display_gameover_message("Black")
@@ -182,15 +252,16 @@ def run_game():
             elif event.type == pg.MOUSEMOTION:
                 # --- DRAG AND DROP LOGIC ---
                 if clicked_piece and dragging:
+                    # only where the piece was and where it is now have changed
+                    old_hover = hover_piece
                     hover_piece = clicked_piece[2].copy()
                     mouse_x, mouse_y = event.pos
                     hover_piece.center = (mouse_x, mouse_y)
-                    draw_board()
-                    draw_pieces(game.board)
-                    highlight(legal_moves, game.board.board)
-                    [screen.blit(s[0],s[1]) for s in squares if pg.Rect.colliderect(s[1], clicked_piece[2])]
-                    screen.blit(clicked_piece[1], hover_piece)
-                                
-        # update display 144 times/sec
-        pg.display.update()
-        clock.tick(144)
\ No newline at end of file
+                    for area in (old_hover, hover_piece):
+                        redraw(area, pieces, legal_moves, game.board.board, clicked_piece, hover_piece)
+
+        # send the parts of the window that changed this frame to the display
+        if dirty_rects:
+            pg.display.update(dirty_rects)
+            dirty_rects.clear()
+        clock.tick(FPS if dragging else IDLE_FPS)
\ No newline at end of file
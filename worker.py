@@ -0,0 +1,106 @@
+import queue
+import threading
+
+import ai
+
+# worker - runs the AI's search on a background thread so the GUI keeps drawing and handling events while the AI thinks.
+# The search works on its own copy of the board, and everything it reports goes through a queue that the GUI reads once
+# a frame with poll(), so the two threads never touch the same objects:
+#   ('info', progress)  after every finished iteration (depth, score, best move, pv, nodes, seconds - see ai.Searcher)
+#   ('bestmove', move)  when the search is done (move is None if there was no legal move, or the search was stopped first)
+# stop() ends the search early (it still reports the best move of the last finished iteration), and close() stops it
+# and waits for the thread, for when the window is closed.
+# Pondering: after the AI moves, ponder() plays the reply the AI expects (the second move of its principal variation)
+# and searches the board after it, with no time limit, while the opponent thinks.  Once the opponent has moved,
+# ponderhit() checks whether they played the expected move.  If they did, the ponder search carries on as the AI's
+# search for this move and reports as usual; if not, it is stopped and its messages are thrown away, and a new search
+# has to be started - which still finds the positions the ponder search saw in the (shared) transposition table.
+
+class AIWorker:
+
+    def __init__(self, searcher=None):
+        self.searcher = searcher or ai.Searcher()
+        self.searcher.on_iteration = self._report
+        self.messages = queue.Queue()
+        self.thread = None
+        self.ponder_board = None # the board being pondered on, if any
+
+    def _report(self, progress):
+        self.messages.put(('info', progress))
+
+    def _run(self, board, max_depth, movetime, time_left, increment, ponder):
+        move = None
+        try:
+            move = self.searcher.iterative_deepening(board, max_depth, movetime, time_left, increment, ponder)[1]
+        finally:
+            self.messages.put(('bestmove', move))
+
+    def thinking(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, board, max_depth=None, movetime=None, time_left=None, increment=0):
+        # starts searching board (see ai.Searcher.iterative_deepening for the limits).  The board isn't changed.
+        # The last search has to be finished (its bestmove polled) or closed first.
+        self._start(board.copy(), max_depth, movetime, time_left, increment, False)
+
+    def _start(self, board, max_depth, movetime, time_left, increment, ponder):
+        # the thread of the last search may still be finishing up after sending its bestmove
+        if self.thread is not None:
+            self.thread.join()
+        self.searcher.stop = False
+        self.thread = threading.Thread(target=self._run, args=(board, max_depth, movetime, time_left, increment, ponder), daemon=True)
+        self.thread.start()
+
+    def predicted_reply(self, board):
+        # the move the last search expects to be played on board (the board after the AI's move), or None
+        pv = self.searcher.pv
+        if len(pv) < 2 or len(board.undo_stack) == 0 or board.undo_stack[-1][0] != pv[0]:
+            return None
+        return pv[1]
+
+    def ponder(self, board):
+        # starts pondering on board, the board after the AI's move.  Returns False if there is no reply to ponder on.
+        reply = self.predicted_reply(board)
+        if reply is None:
+            return False
+        self.ponder_board = board.copy()
+        self.ponder_board.make_move(reply)
+        self._start(self.ponder_board.copy(), None, None, None, 0, True)
+        return True
+
+    def ponderhit(self, board, movetime=None, time_left=None, increment=0):
+        # called once the opponent has moved, with the board after their move and the time limits for the AI's move.
+        # Returns True if the ponder search is now searching this move, False if a new search has to be started.
+        if self.ponder_board is None:
+            return False
+        hit = self.ponder_board.zobrist == board.zobrist
+        self.ponder_board = None
+        if hit:
+            self.searcher.ponderhit(movetime, time_left, increment)
+            return True
+        self.cancel()
+        return False
+
+    def cancel(self):
+        # stops the search (or ponder search) and throws away what it reported, for when its result isn't wanted
+        self.ponder_board = None
+        self.close()
+        self.poll()
+
+    def poll(self):
+        # the messages the search has sent since the last call, oldest first.  Never blocks.
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def stop(self):
+        self.searcher.stop = True
+
+    def close(self):
+        self.stop()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
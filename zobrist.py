@@ -0,0 +1,32 @@
+import random
+
+# zobrist - random 64 bit keys used to hash board states.  The hash of a board is the xor of the keys of everything
+# in it (each piece on its square, the side to move, the castling rights and the en passant file), so it can be updated
+# incrementally when a move is made by xoring the changed keys in and out (see BoardState.set_square and make_move).
+# The keys are generated from a fixed seed so hashes are the same on every run.
+
+_random = random.Random(20221)
+
+# PIECE_KEYS[piece][square], piece 0 (empty) has all zero keys so empty squares don't change the hash
+PIECE_KEYS = [[0] * 64] + [[_random.getrandbits(64) for _ in range(64)] for _ in range(12)]
+BLACK_TO_MOVE_KEY = _random.getrandbits(64)
+# CASTLING_KEYS[castling] - one key for each combination of the castling flags
+CASTLING_KEYS = [0] + [_random.getrandbits(64) for _ in range(15)]
+# EN_PASSANT_KEYS[file]
+EN_PASSANT_KEYS = [_random.getrandbits(64) for _ in range(8)]
+
+def hash_state(current_move, castling, en_passant):
+    # the part of the hash that isn't the pieces - the side to move, the castling rights and the en passant file
+    key = CASTLING_KEYS[castling]
+    if current_move == 0:
+        key ^= BLACK_TO_MOVE_KEY
+    if en_passant is not None:
+        key ^= EN_PASSANT_KEYS[en_passant & 7]
+    return key
+
+def hash_board(board):
+    # computes the hash of a board state from scratch
+    key = hash_state(board.current_move, board.castling, board.en_passant)
+    for sq, piece in enumerate(board.squares):
+        key ^= PIECE_KEYS[piece][sq]
+    return key